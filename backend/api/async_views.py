@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponseNotFound
+from django.shortcuts import redirect
+from django.urls import URLPattern
+
+from foodgram.profiling import profile_in_thread
+from recipes.models import ShortLink
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_API_THREADS,
+    thread_name_prefix='async-api'
+)
+
+# Отдельный пул для входа и регистрации: хеширование паролей не
+# занимает потоки чтения API.
+hash_executor = ThreadPoolExecutor(
+    max_workers=settings.AUTH_HASH_THREADS,
+    thread_name_prefix='auth-hash'
+)
+
+
+def run_in_pool(func, pool=executor):
+    """Запуск синхронного кода вне event loop в пуле потоков."""
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            with profile_in_thread():
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper, thread_sensitive=False, executor=pool)
+
+
+def as_async_view(sync_view, pool=executor):
+    """Асинхронная обёртка над синхронным представлением DRF.
+
+    Аутентификация, запросы к БД и сериализация выполняются в пуле
+    потоков, поэтому медленный запрос к БД не блокирует процесс.
+    """
+    def render(request, *args, **kwargs):
+        response = sync_view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    render_in_pool = run_in_pool(render, pool)
+
+    async def view(request, *args, **kwargs):
+        return await render_in_pool(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    view.cls = sync_view.cls
+    view.actions = getattr(sync_view, 'actions', None)
+    return view
+
+
+def view_actions(callback):
+    """Действия вьюсета или HTTP-методы обычного APIView."""
+    actions = getattr(callback, 'actions', None)
+    if actions is not None:
+        return set(actions.values())
+    return {method for method in callback.cls.http_method_names
+            if hasattr(callback.cls, method)}
+
+
+def asyncify_patterns(urlpatterns, async_actions, pool=executor):
+    """Замена представлений вьюсетов на асинхронные обёртки.
+
+    async_actions — словарь {вьюсет: множество действий}, для APIView
+    действия — HTTP-методы; маршрут переводится в асинхронный режим,
+    если его действия входят в набор.
+    """
+    patterns = []
+    for pattern in urlpatterns:
+        callback = pattern.callback
+        actions = async_actions.get(getattr(callback, 'cls', None), ())
+        if actions and view_actions(callback) & set(actions):
+            pattern = URLPattern(pattern.pattern,
+                                 as_async_view(callback, pool),
+                                 pattern.default_args, pattern.name)
+        patterns.append(pattern)
+    return patterns
+
+
+@run_in_pool
+def get_full_url(short_url):
+    return ShortLink.objects.filter(
+        short_url=short_url).values_list('full_url', flat=True).first()
+
+
+async def redirection(request, short_url):
+    full_url = await get_full_url(short_url)
+    if full_url is None:
+        return HttpResponseNotFound(f'Страница не найдена - {short_url}')
+    return redirect(full_url)
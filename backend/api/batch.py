@@ -0,0 +1,140 @@
+import asyncio
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from foodgram.admission import get_action
+from foodgram.replicas import subrequest_routing
+from .serializers import BatchSerializer
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.BATCH_THREADS,
+    thread_name_prefix='batch'
+)
+
+
+def heavy_actions():
+    if not settings.ADMISSION_CONTROL:
+        return set()
+    return {tuple(view_action)
+            for options in settings.ADMISSION_CLASSES.values()
+            for view_action in options['actions']}
+
+
+def error(status, detail):
+    return {'status': status, 'body': {'detail': detail}}
+
+
+class BatchView(APIView):
+    """Несколько запросов к API за один HTTP-запрос.
+
+    Подзапросы выполняются по порядку через URLconf и вьюсеты без
+    промежуточных слоёв, с пользователем и токеном пакетного запроса.
+    При parallel=true идущие подряд GET-подзапросы выполняются
+    одновременно. Дорогие действия из ADMISSION_CLASSES в пакете
+    не выполняются, чтобы не обходить ограничение нагрузки. GET-подзапросы
+    читают с реплик, пока пакет ничего не записал.
+    """
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['requests']
+        parallel = serializer.validated_data['parallel']
+        self.heavy_actions = heavy_actions()
+        results = []
+        reads = []
+        for item in items:
+            if parallel and item['method'] == 'GET':
+                reads.append(item)
+                continue
+            results.extend(self.run_reads(reads))
+            reads = []
+            results.append(self.dispatch_item(request, item))
+        results.extend(self.run_reads(reads))
+        return Response(results)
+
+    def run_reads(self, items):
+        if len(items) < 2:
+            return [self.dispatch_item(self.request, item) for item in items]
+        # Копия контекста на подзапрос: состояние маршрутизации реплик
+        # пакетного запроса доступно в потоках пула.
+        futures = [
+            executor.submit(contextvars.copy_context().run,
+                            self.dispatch_in_thread, self.request, item)
+            for item in items]
+        return [future.result() for future in futures]
+
+    def dispatch_in_thread(self, request, item):
+        close_old_connections()
+        try:
+            return self.dispatch_item(request, item)
+        finally:
+            close_old_connections()
+
+    def build_request(self, request, item):
+        url = urlsplit(item['path'])
+        body = b''
+        if item.get('body') is not None:
+            body = json.dumps(item['body']).encode()
+        environ = {
+            key: value for key, value in request.META.items()
+            if not key.startswith('wsgi.')}
+        environ.update({
+            'REQUEST_METHOD': item['method'],
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+            'wsgi.url_scheme': request.scheme,
+        })
+        subrequest = WSGIRequest(environ)
+        # Аутентификация пакетного запроса переиспользуется в подзапросах.
+        subrequest.user = request.user
+        subrequest._force_auth_user = request.user
+        subrequest._force_auth_token = request.auth
+        return subrequest, url.path
+
+    def dispatch_item(self, request, item):
+        subrequest, path = self.build_request(request, item)
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return error(404, 'Страница не найдена.')
+        if getattr(match.func, 'view_class', None) is BatchView:
+            return error(400, 'Вложенные пакеты не поддерживаются.')
+        if get_action(subrequest, match.func) in self.heavy_actions:
+            return error(400, 'Действие выполняется только отдельным '
+                              'запросом.')
+        subrequest.resolver_match = match
+        view = match.func
+        if asyncio.iscoroutinefunction(view):
+            view = async_to_sync(view)
+        with subrequest_routing(subrequest.method):
+            response = view(subrequest, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        result = {'status': response.status_code}
+        if response.streaming:
+            result['body'] = None
+        elif response.get('Content-Type', '').startswith(
+                'application/json'):
+            result['body'] = json.loads(response.content or b'null')
+        else:
+            result['body'] = response.content.decode(errors='replace')
+        if response.has_header('Location'):
+            result['headers'] = {'Location': response['Location']}
+        return result
@@ -1,16 +1,34 @@
+from django import forms
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import (
     BooleanFilter,
     CharFilter,
+    ChoiceFilter,
+    Filter,
     FilterSet,
-    ModelChoiceFilter,
-    AllValuesMultipleFilter
+    ModelChoiceFilter
 )
-from recipes.models import Ingredient, Recipe
+from django_filters.widgets import QueryArrayWidget
+from recipes.models import FavoriteRecipe, Ingredient, Recipe, ShoppingCart
+from recipes.tags import get_tag_map
+from .services import filter_user_recipes, flags_from_sets, get_user_flags
 
 User = get_user_model()
 
 
+class MultipleValueField(forms.Field):
+    """Поле для повторяющегося параметра запроса (?tags=a&tags=b)."""
+    widget = QueryArrayWidget
+
+    def to_python(self, value):
+        return [item for item in value or () if item]
+
+
+class MultipleValueFilter(Filter):
+    field_class = MultipleValueField
+
+
 class IngredientFilter(FilterSet):
     """Фильтр по названию ингредиента."""
     name = CharFilter(field_name='name',
@@ -23,23 +41,73 @@ class IngredientFilter(FilterSet):
 
 class RecipeFilter(FilterSet):
     """Фильтр по полям рецепта."""
+    ORDERINGS = {
+        'popular': ('-popularity', '-id'),
+        'trending': ('-trending', '-id'),
+        'cooking_time': ('cooking_time', 'id'),
+    }
+
     author = ModelChoiceFilter(queryset=User.objects.all())
-    tags = AllValuesMultipleFilter(field_name='tags__slug')
+    tags = MultipleValueFilter(method='filter_by_tags')
+    tags_mode = ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')),
+        method='filter_nothing')
     is_favorited = BooleanFilter(
         method='filter_by_is_favorited')
     is_in_shopping_cart = BooleanFilter(
         method='filter_by_is_in_shopping_cart')
+    ordering = ChoiceFilter(
+        choices=[(name, name) for name in ORDERINGS],
+        method='filter_ordering')
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['tags', 'tags_mode', 'author', 'is_favorited',
+                  'is_in_shopping_cart', 'ordering']
 
-    def filter_by_is_favorited(self, queryset, name, value):
-        if value and self.request.user.is_authenticated:
-            return queryset.filter(is_favorited=True)
+    def filter_nothing(self, queryset, name, value):
         return queryset
 
+    def filter_by_tags(self, queryset, name, value):
+        """Фильтр по слагам тегов через EXISTS, без JOIN и DISTINCT.
+
+        По умолчанию рецепт должен иметь любой из тегов,
+        при tags_mode=all — все теги.
+        """
+        if not value:
+            return queryset
+        tag_map = get_tag_map()
+        tag_ids = [tag_map[slug] for slug in value if slug in tag_map]
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            if len(tag_ids) < len(set(value)):
+                return queryset.none()
+            for tag_id in set(tag_ids):
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag_id=tag_id)))
+            return queryset
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(Exists(recipe_tags.filter(tag_id__in=tag_ids)))
+
+    def filter_by_is_favorited(self, queryset, name, value):
+        if not value or not self.request.user.is_authenticated:
+            return queryset
+        if flags_from_sets():
+            return filter_user_recipes(
+                queryset, FavoriteRecipe, self.request.user,
+                get_user_flags(self.request).favorites)
+        return queryset.filter(is_favorited=True)
+
     def filter_by_is_in_shopping_cart(self, queryset, name, value):
-        if value and self.request.user.is_authenticated:
-            return queryset.filter(is_in_shopping_cart=True)
-        return queryset
+        if not value or not self.request.user.is_authenticated:
+            return queryset
+        if flags_from_sets():
+            return filter_user_recipes(
+                queryset, ShoppingCart, self.request.user,
+                get_user_flags(self.request).cart)
+        return queryset.filter(is_in_shopping_cart=True)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*self.ORDERINGS[value])
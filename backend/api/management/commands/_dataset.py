@@ -0,0 +1,76 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.scores import update_scores
+from users.models import Follow
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    """Откат транзакции с временным набором данных."""
+
+
+def generate_dataset(n_users, n_recipes, favorites_per_user=25,
+                     cart_per_user=5, follows_per_user=10):
+    """Набор данных с реалистичным соотношением таблиц.
+
+    Вызывается внутри транзакции, которая откатывается после замеров.
+    """
+    rnd = random.Random(0)
+    users = User.objects.bulk_create(
+        User(username=f'plan_user_{i}', email=f'plan_{i}@example.com',
+             first_name='Имя', last_name='Фамилия', password='!')
+        for i in range(n_users))
+    tags = Tag.objects.bulk_create(
+        Tag(name=f'plan_tag_{i}', slug=f'plan_tag_{i}')
+        for i in range(10))
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'plan_ingredient_{i}', measurement_unit='г')
+        for i in range(2000))
+    recipes = Recipe.objects.bulk_create(
+        (Recipe(author=rnd.choice(users), name=f'Рецепт {i}',
+                text='Описание', cooking_time=rnd.randint(1, 180))
+         for i in range(n_recipes)), batch_size=2000)
+    RecipeIngredient.objects.bulk_create(
+        (RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                          amount=rnd.randint(1, 500))
+         for recipe in recipes
+         for ingredient in rnd.sample(ingredients, 8)),
+        batch_size=5000)
+    Recipe.tags.through.objects.bulk_create(
+        (Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag.pk)
+         for recipe in recipes for tag in rnd.sample(tags, 2)),
+        batch_size=5000)
+    for model, per_user in ((FavoriteRecipe, favorites_per_user),
+                            (ShoppingCart, cart_per_user)):
+        model.objects.bulk_create(
+            (model(user=user, recipe=recipe)
+             for user in users
+             for recipe in rnd.sample(recipes, per_user)),
+            batch_size=5000, ignore_conflicts=True)
+    Follow.objects.bulk_create(
+        (Follow(user=user, author=author)
+         for user in users
+         for author in rnd.sample(users, follows_per_user)
+         if author != user),
+        batch_size=5000, ignore_conflicts=True)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE recipes_recipe '
+            "SET pub_date = now() - id * interval '1 minute'")
+        cursor.execute(
+            'INSERT INTO recipes_feeditem '
+            '(user_id, recipe_id, author_id, pub_date) '
+            'SELECT f.user_id, r.id, r.author_id, r.pub_date '
+            'FROM users_follow f '
+            'JOIN recipes_recipe r ON r.author_id = f.author_id '
+            'ON CONFLICT DO NOTHING')
+        cursor.execute('ANALYZE')
+    update_scores(full=True)
+    return {'users': users, 'tags': tags, 'ingredients': ingredients,
+            'recipes': recipes}
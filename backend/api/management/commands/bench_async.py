@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+
+MODES = {'sync': 'WSGI (sync)', 'async': 'ASGI (async)'}
+
+
+def default_host():
+    return next((host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                 if host != '*'), 'localhost')
+
+
+class Command(BaseCommand):
+    help = ('Сравнение синхронного и асинхронного режимов при одинаковом '
+            'бюджете памяти: каждый режим замеряется в отдельном процессе '
+            'воркера (потоки gthread против задач ASGI), затем считается, '
+            'сколько таких воркеров помещается в --memory и сколько '
+            'запросов они обслуживают.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/recipes/')
+        parser.add_argument('--host', default=default_host())
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--threads', type=int,
+            default=int(os.getenv('GUNICORN_THREADS', 4)),
+            help='Потоки синхронного воркера, как у gthread.')
+        parser.add_argument(
+            '--concurrency', type=int, default=200,
+            help='Одновременные запросы асинхронного воркера.')
+        parser.add_argument('--memory', type=int, default=1024,
+                            help='Бюджет памяти на воркеры, МиБ.')
+        parser.add_argument(
+            '--db-latency', type=float, default=0.02,
+            help='Искусственная задержка каждого запроса к БД, сек.')
+        parser.add_argument('--mode', choices=MODES,
+                            help='Замер одного режима в этом процессе.')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.stdout.write(json.dumps(self.measure(options)))
+            return
+        if not settings.ASYNC_API:
+            self.stdout.write(self.style.WARNING(
+                'ASYNC_API выключен: маршруты обслуживаются синхронно.'))
+        results = {mode: self.run_process(mode, options) for mode in MODES}
+        for mode, result in results.items():
+            # Сколько таких воркеров помещается в бюджет памяти (RSS в КиБ).
+            workers = max(1, options['memory'] * 1024 // result['max_rss'])
+            result['total'] = workers * result['rps']
+            self.stdout.write(
+                f'{MODES[mode]}: {result["rps"]:.1f} запр./с при '
+                f'{result["concurrency"]} одновременных, RSS воркера '
+                f'{result["max_rss"] / 1024:.0f} МиБ; в '
+                f'{options["memory"]} МиБ {workers} воркеров — '
+                f'{result["total"]:.1f} запр./с, '
+                f'{workers * result["concurrency"]} одновременных')
+        self.stdout.write(self.style.SUCCESS(
+            f'Выигрыш при равной памяти: '
+            f'x{results["async"]["total"] / results["sync"]["total"]:.1f}'))
+
+    def run_process(self, mode, options):
+        command = [
+            sys.executable, sys.argv[0], 'bench_async', '--mode', mode,
+            '--path', options['path'], '--host', options['host'],
+            '--requests', str(options['requests']),
+            '--threads', str(options['threads']),
+            '--concurrency', str(options['concurrency']),
+            '--db-latency', str(options['db_latency']),
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f'Замер {mode} завершился ошибкой:\n'
+                               f'{result.stderr}')
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def measure(self, options):
+        latency = options['db_latency']
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            if slow_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_query)
+
+        connection_created.connect(add_latency, weak=False)
+        add_latency(None, connection)
+        runner = getattr(self, f'run_{options["mode"]}')
+        concurrency = (options['threads'] if options['mode'] == 'sync'
+                       else options['concurrency'])
+        started = time.perf_counter()
+        statuses = runner(options['path'], options['host'],
+                          options['requests'], concurrency)
+        elapsed = time.perf_counter() - started
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        failed = [status for status in statuses if status != 200]
+        if failed:
+            raise CommandError(
+                f'{len(failed)} ответов не 200, например {failed[0]}.')
+        return {'rps': options['requests'] / elapsed, 'max_rss': max_rss,
+                'concurrency': concurrency}
+
+    def run_sync(self, path, host, total, concurrency):
+        """Потоки, как в воркере gthread с concurrency потоками."""
+        def fetch(count):
+            client = Client(SERVER_NAME=host)
+            try:
+                return [client.get(path).status_code for _ in range(count)]
+            finally:
+                connection.close()
+
+        shares = [total // concurrency + (index < total % concurrency)
+                  for index in range(concurrency)]
+        with ThreadPoolExecutor(concurrency) as pool:
+            return [status for statuses in pool.map(fetch, shares)
+                    for status in statuses]
+
+    def run_async(self, path, host, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        url = urlsplit(path)
+        # get() всегда добавляет host: testserver, поэтому scope собирается
+        # вручную.
+        scope = {'path': url.path, 'query_string': url.query,
+                 'server': (host, '80')}
+
+        async def fetch():
+            async with semaphore:
+                response = await client.request(
+                    **scope, headers=[(b'host', host.encode())])
+                return response.status_code
+
+        async def main():
+            return await asyncio.gather(*(fetch() for _ in range(total)))
+
+        return asyncio.run(main())
@@ -0,0 +1,76 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+from foodgram.postgresql_pool.base import pool_stats
+
+
+class Command(BaseCommand):
+    help = ('Задержка дешёвых запросов и доля повторно использованных '
+            'соединений с БД при текущих настройках (DB_POOL и др.).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/tags/')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        connects = []
+        latencies = []
+        lock = threading.Lock()
+
+        def count_connect(sender, connection, **kwargs):
+            with lock:
+                connects.append(connection.alias)
+
+        def worker(total):
+            client = Client()
+            for _ in range(total):
+                # Как обработчик WSGI: соединения закрываются (или
+                # возвращаются в пул) в начале и в конце запроса.
+                close_old_connections()
+                started = time.perf_counter()
+                client.get(options['path'])
+                elapsed = time.perf_counter() - started
+                close_old_connections()
+                with lock:
+                    latencies.append(elapsed)
+            connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker, args=(
+                options['requests'] // options['threads'],))
+            for _ in range(options['threads'])]
+        connection_created.connect(count_connect, weak=False)
+        try:
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count_connect)
+
+        latencies.sort()
+        self.stdout.write(
+            f'{len(latencies)} запросов за {elapsed:.2f} с, '
+            f'медиана {statistics.median(latencies) * 1000:.2f} мс, '
+            f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} мс')
+        stats = pool_stats()
+        if not stats:
+            self.stdout.write(
+                f'Пул выключен: открыто соединений {len(connects)}.')
+        for alias, alias_stats in stats.items():
+            self.stdout.write(
+                f'Пул {alias}: новых соединений {alias_stats["connects"]}, '
+                f'повторных {alias_stats["reuses"]}, '
+                f'доля повторного использования '
+                f'{alias_stats["reuse_ratio"]:.1%}, '
+                f'ожиданий {alias_stats["waits"]}, '
+                f'неудачных проверок {alias_stats["failed_checks"]}')
@@ -0,0 +1,99 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from djoser.views import TokenCreateView
+from rest_framework.test import APIRequestFactory
+
+from users.models import User
+
+PREFIX = 'bench-login-'
+PASSWORD = 'Bench-login-password-1'
+
+
+class Command(BaseCommand):
+    help = ('Пропускная способность входа через token/login: входов '
+            'в секунду на ядро для алгоритмов хеширования паролей. '
+            'Пользователи создаются с хешами pbkdf2, как у старых '
+            'учётных записей, поэтому первые входы пересчитывают хеш.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hashers', default='pbkdf2,scrypt,argon2')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--logins', type=int, default=500)
+        parser.add_argument('--threads', type=int,
+                            default=len(os.sched_getaffinity(0)))
+
+    def handle(self, *args, **options):
+        names = options['hashers'].split(',')
+        unknown = set(names) - set(settings.PASSWORD_HASHER_CLASSES)
+        if unknown:
+            raise CommandError(f'Неизвестные алгоритмы: {unknown}.')
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f'Есть пользователи {PREFIX}*, удалите их.')
+        self.threads = options['threads']
+        self.cores = min(self.threads, len(os.sched_getaffinity(0)))
+        self.stdout.write(
+            f'{self.threads} потоков, {self.cores} ядер, один процесс.')
+        for name in names:
+            hashers = [settings.PASSWORD_HASHER_CLASSES[name]] + [
+                path for path in settings.PASSWORD_HASHER_CLASSES.values()
+                if path != settings.PASSWORD_HASHER_CLASSES[name]]
+            with override_settings(PASSWORD_HASHERS=hashers):
+                try:
+                    self.report(name, options['users'], options['logins'])
+                finally:
+                    User.objects.filter(
+                        username__startswith=PREFIX).delete()
+
+    def report(self, name, users, logins):
+        started = time.perf_counter()
+        make_password(PASSWORD)
+        hash_time = time.perf_counter() - started
+        encoded = make_password(PASSWORD, hasher='pbkdf2_sha256')
+        User.objects.bulk_create(
+            User(username=f'{PREFIX}{index}',
+                 email=f'{PREFIX}{index}@example.com',
+                 password=encoded)
+            for index in range(users))
+        self.emails = [f'{PREFIX}{index}@example.com'
+                       for index in range(users)]
+        first = self.run(users)
+        steady = self.run(logins)
+        self.stdout.write(
+            f'{name:7} хеш {hash_time * 1000:6.1f} мс | первые входы '
+            f'{first:7.1f}/с | вход {steady:7.1f}/с, '
+            f'{steady / self.cores:7.1f}/с на ядро')
+
+    def run(self, logins):
+        """Входы в секунду при self.threads одновременных потоках."""
+        shares = [logins // self.threads + (index < logins % self.threads)
+                  for index in range(self.threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.threads) as pool:
+            failed = sum(pool.map(self.login, range(self.threads), shares))
+        elapsed = time.perf_counter() - started
+        if failed:
+            raise CommandError(f'Неудачных входов: {failed}.')
+        return logins / elapsed
+
+    def login(self, offset, count):
+        view = TokenCreateView.as_view()
+        factory = APIRequestFactory()
+        failed = 0
+        try:
+            for index in range(count):
+                email = self.emails[(offset + index * self.threads)
+                                    % len(self.emails)]
+                request = factory.post(
+                    '/api/auth/token/login/',
+                    {'email': email, 'password': PASSWORD}, format='json')
+                failed += view(request).status_code != 200
+        finally:
+            connection.close()
+        return failed
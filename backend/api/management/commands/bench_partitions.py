@@ -0,0 +1,126 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+PLAIN_TABLE = 'bench_user_recipes_plain'
+HASH_TABLE = 'bench_user_recipes_hash'
+
+
+class Command(BaseCommand):
+    help = ('Сравнение обычной и секционированной по хешу user_id таблицы '
+            'избранного: проверки EXISTS, списки пользователя и VACUUM. '
+            'Таблицы создаются на время замера и удаляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000)
+        parser.add_argument('--per-user', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--partitions', type=int, default=16)
+        parser.add_argument('--probes', type=int, default=2000)
+        parser.add_argument('--delete-fraction', type=float, default=0.05)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Замер работает только с PostgreSQL.')
+        if options['per_user'] > options['recipes']:
+            raise CommandError('--per-user больше числа рецептов.')
+        self.users = max(1, options['rows'] // options['per_user'])
+        self.options = options
+        # VACUUM нельзя выполнять внутри транзакции.
+        connection.set_autocommit(True)
+        try:
+            for table, partitions in ((PLAIN_TABLE, 0),
+                                      (HASH_TABLE, options['partitions'])):
+                self.create_table(table, partitions)
+                self.report(table, partitions)
+        finally:
+            with connection.cursor() as cursor:
+                for table in (PLAIN_TABLE, HASH_TABLE):
+                    cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+    def run_sql(self, sql, params=None):
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall() if cursor.description else None
+        return rows, time.perf_counter() - started
+
+    def create_table(self, table, partitions):
+        partition_by = ' PARTITION BY HASH (user_id)' if partitions else ''
+        self.run_sql(f'DROP TABLE IF EXISTS {table}')
+        self.run_sql(
+            f'CREATE TABLE {table} (id bigserial, user_id bigint NOT NULL, '
+            f'recipe_id bigint NOT NULL, created timestamptz NOT NULL '
+            f'DEFAULT now()){partition_by}')
+        for remainder in range(partitions):
+            self.run_sql(
+                f'CREATE TABLE {table}_p{remainder} PARTITION OF {table} '
+                f'FOR VALUES WITH (MODULUS {partitions}, '
+                f'REMAINDER {remainder})')
+        # Рецепты пользователя различны: шаг по кругу из --recipes.
+        _, elapsed = self.run_sql(
+            f'INSERT INTO {table} (user_id, recipe_id) '
+            f'SELECT u, (u * 7919 + k) %% %s + 1 '
+            f'FROM generate_series(1, %s) u, generate_series(0, %s - 1) k',
+            [self.options['recipes'], self.users, self.options['per_user']])
+        key = 'id, user_id' if partitions else 'id'
+        self.run_sql(f'ALTER TABLE {table} ADD PRIMARY KEY ({key})')
+        self.run_sql(f'ALTER TABLE {table} ADD UNIQUE (user_id, recipe_id)')
+        self.run_sql(f'CREATE INDEX ON {table} (recipe_id)')
+        self.run_sql(f'VACUUM ANALYZE {table}')
+        self.stdout.write(
+            f'{table}: {self.users * self.options["per_user"]} строк, '
+            f'загрузка и индексы {elapsed:.1f} с')
+
+    def probe(self, sql, make_params):
+        latencies = []
+        for _ in range(self.options['probes']):
+            _, elapsed = self.run_sql(sql, make_params())
+            latencies.append(elapsed)
+        latencies.sort()
+        return (statistics.median(latencies) * 1000,
+                latencies[int(len(latencies) * 0.99)] * 1000)
+
+    def scanned_relations(self, sql, params):
+        rows, _ = self.run_sql(f'EXPLAIN {sql}', params)
+        return sum(' on ' in row[0] for row in rows)
+
+    def report(self, table, partitions):
+        recipes = self.options['recipes']
+
+        def user_recipe():
+            return [random.randint(1, self.users),
+                    random.randint(1, recipes)]
+
+        exists_sql = (f'SELECT EXISTS(SELECT 1 FROM {table} '
+                      f'WHERE user_id = %s AND recipe_id = %s)')
+        list_sql = f'SELECT recipe_id FROM {table} WHERE user_id = %s'
+        for name, sql, make_params in (
+                ('EXISTS', exists_sql, user_recipe),
+                ('список пользователя', list_sql,
+                 lambda: [random.randint(1, self.users)])):
+            median, p99 = self.probe(sql, make_params)
+            self.stdout.write(
+                f'  {name}: медиана {median:.3f} мс, p99 {p99:.3f} мс, '
+                f'узлов сканирования в плане '
+                f'{self.scanned_relations(sql, make_params())}')
+        rows, _ = self.run_sql(
+            'SELECT pg_total_relation_size(relid) FROM '
+            'pg_partition_tree(%s::regclass)' if partitions else
+            'SELECT pg_total_relation_size(%s::regclass)', [table])
+        self.stdout.write(
+            f'  размер с индексами {sum(row[0] for row in rows) >> 20} МБ')
+        _, elapsed = self.run_sql(
+            f'DELETE FROM {table} WHERE user_id %% 1000 < %s',
+            [int(self.options['delete_fraction'] * 1000)])
+        self.stdout.write(
+            f'  удаление {self.options["delete_fraction"]:.0%} '
+            f'пользователей: {elapsed:.1f} с')
+        if partitions:
+            _, one = self.run_sql(f'VACUUM {table}_p0')
+            self.stdout.write(f'  VACUUM одной секции: {one:.2f} с')
+        _, elapsed = self.run_sql(f'VACUUM {table}')
+        self.stdout.write(f'  VACUUM всей таблицы: {elapsed:.2f} с')
@@ -0,0 +1,76 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from ._dataset import Rollback, generate_dataset
+
+ENGINES = ('exists', 'sets')
+
+
+class Command(BaseCommand):
+    help = ('Сравнение способов вычисления is_favorited/is_in_shopping_cart: '
+            'подзапросы EXISTS и множества id пользователя. Для выбора '
+            'USER_FLAGS_ENGINE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--favorites', type=int, default=25,
+                            help='Рецептов в избранном у пользователя.')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Замеры выполняются на PostgreSQL.')
+        try:
+            with transaction.atomic():
+                dataset = generate_dataset(
+                    options['users'], options['recipes'],
+                    favorites_per_user=options['favorites'])
+                self.compare(dataset, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def compare(self, dataset, repeat):
+        client = APIClient()
+        client.force_authenticate(dataset['users'][0])
+        recipe = dataset['recipes'][0].pk
+        paths = ('/api/recipes/', '/api/recipes/?is_favorited=1',
+                 '/api/recipes/?is_in_shopping_cart=1',
+                 f'/api/recipes/{recipe}/')
+        totals = {}
+        for engine in ENGINES:
+            with override_settings(USER_FLAGS_ENGINE=engine):
+                for path in paths:
+                    median, sql_time, queries = self.measure(
+                        client, path, repeat)
+                    totals[engine] = totals.get(engine, 0) + median
+                    self.stdout.write(
+                        f'{engine:7} {path:40} {median * 1000:7.2f} мс, '
+                        f'SQL {sql_time * 1000:6.2f} мс, '
+                        f'запросов {queries}')
+        best = min(totals, key=totals.get)
+        self.stdout.write(self.style.SUCCESS(
+            f'Быстрее: USER_FLAGS_ENGINE={best} '
+            f'({totals[best] * 1000:.1f} мс против '
+            f'{max(totals.values()) * 1000:.1f} мс на набор запросов).'))
+
+    def measure(self, client, path, repeat):
+        client.get(path)
+        timings = []
+        sql_timings = []
+        for _ in range(repeat):
+            reset_queries()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                client.get(path)
+                timings.append(time.perf_counter() - started)
+            sql_timings.append(sum(
+                float(query['time']) for query in captured.captured_queries))
+        return (statistics.median(timings), statistics.median(sql_timings),
+                len(captured))
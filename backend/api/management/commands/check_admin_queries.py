@@ -0,0 +1,86 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ._dataset import Rollback, generate_dataset
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Проверка числа запросов страниц админки на сгенерированном '
+            'наборе данных: оно не должно зависеть от числа строк.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--max-queries', type=int, default=12)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка работает только с PostgreSQL.')
+        self.violations = []
+        try:
+            with transaction.atomic():
+                dataset = generate_dataset(
+                    options['users'], options['recipes'])
+                self.check_pages(dataset, options['max_queries'])
+                raise Rollback
+        except Rollback:
+            pass
+        if self.violations:
+            for violation in self.violations:
+                self.stderr.write(violation)
+            raise CommandError(
+                f'Страниц сверх лимита запросов: {len(self.violations)}.')
+        self.stdout.write(self.style.SUCCESS(
+            'Число запросов всех страниц админки в норме.'))
+
+    def pages(self, dataset):
+        recipe = dataset['recipes'][0]
+        user = dataset['users'][0]
+        tag = dataset['tags'][0]
+        for model in ('recipes_recipe', 'recipes_ingredient', 'recipes_tag',
+                      'recipes_favoriterecipe', 'recipes_shoppingcart',
+                      'users_user', 'users_follow'):
+            yield reverse(f'admin:{model}_changelist'), 0
+        yield (reverse('admin:recipes_recipe_changelist')
+               + f'?tags__id__exact={tag.pk}'), 0
+        yield reverse('admin:recipes_recipe_changelist') + '?q=plan', 0
+        yield reverse('admin:recipes_recipe_changelist') + '?o=3', 0
+        yield reverse('admin:recipes_ingredient_changelist') + '?q=plan', 0
+        # Виджет автодополнения запрашивает подпись выбранного
+        # ингредиента в каждой строке инлайна.
+        yield (reverse('admin:recipes_recipe_change', args=(recipe.pk,)),
+               recipe.ingredients.count())
+        yield reverse('admin:recipes_recipe_add'), 0
+        yield reverse('admin:users_user_change', args=(user.pk,)), 0
+        yield (reverse('admin:autocomplete') + '?app_label=recipes'
+               '&model_name=recipe&field_name=author&term=plan'), 0
+
+    def check_pages(self, dataset, max_queries):
+        admin = User.objects.create_superuser(
+            username='plan_admin', email='plan_admin@example.com',
+            password='!', first_name='Админ', last_name='Админ')
+        client = Client()
+        client.force_login(admin)
+        for path, per_row in self.pages(dataset):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(path)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{path}: {response.status_code}, запросов '
+                f'{len(captured)}, {elapsed * 1000:.0f} мс')
+            if response.status_code != 200:
+                self.violations.append(
+                    f'{path}: ответ {response.status_code}')
+            elif len(captured) > max_queries + per_row:
+                self.violations.append(
+                    f'{path}: {len(captured)} запросов '
+                    f'(лимит {max_queries + per_row})')
@@ -0,0 +1,56 @@
+import time
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Tag
+
+TAG_SLUG = 'edge-cache-check'
+
+
+class Command(BaseCommand):
+    help = ('Проверка кэша nginx: повторный анонимный запрос берётся '
+            'из кэша, запрос с токеном — нет, изменение тега видно сразу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://nginx')
+        parser.add_argument('--host', default=settings.EDGE_CACHE_HOSTS[0])
+        parser.add_argument('--wait', type=float, default=3)
+
+    def handle(self, *args, **options):
+        self.url = options['url'].rstrip('/') + '/api/tags/'
+        self.host = options['host']
+        self.get()
+        if self.get().headers.get('X-Cache-Status') != 'HIT':
+            raise CommandError(
+                'Повторный запрос не взят из кэша: nginx запущен '
+                'без infra/nginx.microcache.conf или EDGE_CACHE=False.')
+        status = self.get(Authorization='Token check').headers.get(
+            'X-Cache-Status')
+        if status != 'BYPASS':
+            raise CommandError(f'Запрос с токеном: {status}, ждали BYPASS.')
+        tag = Tag.objects.create(name=TAG_SLUG, slug=TAG_SLUG)
+        try:
+            self.wait_for(True, options['wait'])
+        finally:
+            tag.delete()
+        self.wait_for(False, options['wait'])
+        self.stdout.write(self.style.SUCCESS('Кэш nginx работает.'))
+
+    def get(self, **headers):
+        return requests.get(self.url, headers={'Host': self.host, **headers},
+                            timeout=5)
+
+    def wait_for(self, present, timeout):
+        started = time.monotonic()
+        while time.monotonic() - started < timeout:
+            slugs = {tag['slug'] for tag in self.get().json()}
+            if (TAG_SLUG in slugs) == present:
+                self.stdout.write(
+                    f'Тег {"добавлен" if present else "удалён"}: кэш '
+                    f'обновлён за {time.monotonic() - started:.2f} с')
+                return
+            time.sleep(0.1)
+        raise CommandError(
+            f'Кэш не обновился за {timeout} с после изменения тега.')
@@ -0,0 +1,164 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from users.models import Follow
+from ._dataset import Rollback, generate_dataset
+
+# EXPLAIN выполняет сам пагинатор для оценки числа строк.
+SKIPPED_STATEMENTS = re.compile(
+    r'^\s*(SAVEPOINT|RELEASE|ROLLBACK|SET|EXPLAIN)\b', re.IGNORECASE)
+
+
+# Доля строк таблицы, ниже которой последовательное сканирование
+# с фильтром означает недостающий индекс.
+SELECTIVE_FRACTION = 0.05
+
+
+class Command(BaseCommand):
+    help = ('Проверка планов запросов API на сгенерированном наборе данных. '
+            'Завершается ошибкой, если в плане есть последовательное '
+            'сканирование большой таблицы или превышена стоимость.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--large-table', type=int, default=5000,
+                            help='Таблица считается большой начиная с '
+                                 'этого числа строк.')
+        parser.add_argument('--max-cost', type=float, default=5000)
+        parser.add_argument('--verbose-plans', action='store_true')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов работает только с '
+                               'PostgreSQL.')
+        self.options = options
+        self.violations = []
+        try:
+            with transaction.atomic():
+                self.generate(options['users'], options['recipes'])
+                self.check_actions()
+                raise Rollback
+        except Rollback:
+            pass
+        if self.violations:
+            for violation in self.violations:
+                self.stderr.write(violation)
+            raise CommandError(
+                f'Найдено проблемных планов: {len(self.violations)}.')
+        self.stdout.write(self.style.SUCCESS('Все планы запросов в норме.'))
+
+    def generate(self, n_users, n_recipes):
+        dataset = generate_dataset(n_users, n_recipes)
+        self.user = dataset['users'][0]
+        self.author = Follow.objects.filter(user=self.user).first().author
+        self.recipe = dataset['recipes'][len(dataset['recipes']) // 2]
+        self.tags = dataset['tags']
+        self.ingredients = dataset['ingredients']
+
+    def actions(self):
+        recipe = self.recipe.pk
+        author = self.author.pk
+        tags = '&'.join(f'tags={tag.slug}' for tag in self.tags[:2])
+        yield 'tags', 'get', '/api/tags/', False
+        yield ('ingredients search', 'get',
+               '/api/ingredients/?name=plan_ing', False)
+        yield 'recipes list (anon)', 'get', '/api/recipes/', False
+        yield 'recipes list', 'get', '/api/recipes/', True
+        yield 'recipes page 20', 'get', '/api/recipes/?page=20', True
+        yield 'recipes by tags', 'get', f'/api/recipes/?{tags}&facets=1', True
+        yield ('recipes by author', 'get',
+               f'/api/recipes/?author={author}', True)
+        yield 'favorited', 'get', '/api/recipes/?is_favorited=1', True
+        yield ('in shopping cart', 'get',
+               '/api/recipes/?is_in_shopping_cart=1', True)
+        for ordering in ('popular', 'trending', 'cooking_time'):
+            yield (f'ordering {ordering}', 'get',
+                   f'/api/recipes/?ordering={ordering}', True)
+        yield 'recipe detail', 'get', f'/api/recipes/{recipe}/', True
+        yield 'similar', 'get', f'/api/recipes/{recipe}/similar/', False
+        yield 'feed', 'get', '/api/recipes/feed/', True
+        yield ('cookable', 'get', '/api/recipes/cookable/?' + '&'.join(
+            f'ingredients={ingredient.pk}'
+            for ingredient in self.ingredients[:20]), True)
+        yield 'favorite', 'post', f'/api/recipes/{recipe}/favorite/', True
+        yield ('unfavorite', 'delete',
+               f'/api/recipes/{recipe}/favorite/', True)
+        yield 'cart', 'post', f'/api/recipes/{recipe}/shopping_cart/', True
+        yield ('download cart', 'get',
+               '/api/recipes/download_shopping_cart/', True)
+        yield ('remove from cart', 'delete',
+               f'/api/recipes/{recipe}/shopping_cart/', True)
+        yield 'short link', 'get', f'/api/recipes/{recipe}/get-link/', False
+        yield 'users list', 'get', '/api/users/', True
+        yield 'me', 'get', '/api/users/me/', True
+        yield ('subscriptions', 'get',
+               '/api/users/subscriptions/?recipes_limit=3', True)
+        yield ('unsubscribe', 'delete',
+               f'/api/users/{author}/subscribe/', True)
+        yield 'subscribe', 'post', f'/api/users/{author}/subscribe/', True
+
+    def check_actions(self):
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.user)
+        table_sizes = self.table_sizes()
+        for name, method, path, auth in self.actions():
+            client = authenticated if auth else anonymous
+            with CaptureQueriesContext(connection) as captured:
+                response = getattr(client, method)(path)
+            if response.status_code >= 500:
+                self.violations.append(
+                    f'{name}: ответ {response.status_code}')
+            statements = [query['sql'] for query in captured.captured_queries
+                          if not SKIPPED_STATEMENTS.match(query['sql'])]
+            self.stdout.write(f'{name}: {len(statements)} запросов')
+            for sql in statements:
+                self.check_plan(name, sql, table_sizes)
+
+    def table_sizes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")
+            return dict(cursor.fetchall())
+
+    def check_plan(self, name, sql, table_sizes):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        root = plan[0]['Plan']
+        if self.options['verbose_plans']:
+            self.stdout.write(json.dumps(root, ensure_ascii=False, indent=1))
+        problems = []
+        if root['Total Cost'] > self.options['max_cost']:
+            problems.append(f'стоимость {root["Total Cost"]:.0f}')
+        for node, sorted_limit in self.walk(root):
+            relation = node.get('Relation Name')
+            rows = table_sizes.get(relation, 0)
+            if (node['Node Type'] != 'Seq Scan'
+                    or rows < self.options['large_table']):
+                continue
+            if node['Plan Rows'] < rows * SELECTIVE_FRACTION:
+                problems.append(f'Seq Scan по {relation} с фильтром '
+                                f'({node["Plan Rows"]} из {rows:.0f} строк)')
+            elif sorted_limit:
+                problems.append(f'LIMIT после сортировки Seq Scan '
+                                f'по {relation}')
+        if problems:
+            self.violations.append(
+                f'{name}: {", ".join(problems)}\n    {sql[:500]}')
+
+    def walk(self, node, sorted_limit=False, parent=None):
+        """Узлы плана и признак «под LIMIT стоит сортировка»."""
+        if node['Node Type'] == 'Sort' and parent == 'Limit':
+            sorted_limit = True
+        yield node, sorted_limit
+        for child in node.get('Plans', ()):
+            yield from self.walk(child, sorted_limit, node['Node Type'])
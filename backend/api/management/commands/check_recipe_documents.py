@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from api.serializers import RecipeSerializer
+from recipes.constants import RECIPE_DOCUMENTS_BATCH
+from recipes.documents import (build_document, document_queryset,
+                               refresh_documents)
+from recipes.models import Recipe
+
+PROBLEMS = {
+    'missing': 'нет документа',
+    'stale': 'устарел',
+    'format': 'ответ отличается от сериализатора',
+}
+
+
+class Command(BaseCommand):
+    help = ('Проверка готовых документов рецептов: документ есть, '
+            'совпадает с данными рецепта, а ответ из документа — '
+            'с ответом RecipeSerializer.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Пересобрать отсутствующие и устаревшие.')
+        parser.add_argument('--show', type=int, default=10,
+                            help='Сколько расхождений вывести.')
+
+    def handle(self, *args, **options):
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                     if host != '*'), 'localhost')
+        request = RequestFactory(HTTP_HOST=host).get('/')
+        request.user = AnonymousUser()
+        self.context = {'request': request}
+        problems = {problem: [] for problem in PROBLEMS}
+        recipe_ids = list(Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True))
+        for start in range(0, len(recipe_ids), RECIPE_DOCUMENTS_BATCH):
+            batch = recipe_ids[start:start + RECIPE_DOCUMENTS_BATCH]
+            for recipe in document_queryset().select_related(
+                    'document').filter(pk__in=batch):
+                problem = self.find_problem(recipe)
+                if problem:
+                    problems[problem].append(recipe.pk)
+        for problem, ids in problems.items():
+            if ids:
+                self.stdout.write(f'{PROBLEMS[problem]}: {len(ids)}, '
+                                  f'например {ids[:options["show"]]}')
+        if options['fix']:
+            refresh_documents(problems['missing'] + problems['stale'])
+            problems['missing'] = problems['stale'] = []
+        if any(problems.values()):
+            raise CommandError(
+                f'Расхождения в документах {len(recipe_ids)} рецептов.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Документы {len(recipe_ids)} рецептов согласованы.'))
+
+    def find_problem(self, recipe):
+        document = getattr(recipe, 'document', None)
+        if document is None:
+            return 'missing'
+        if document.data != build_document(recipe):
+            return 'stale'
+        serialized = RecipeSerializer(recipe, context=self.context).data
+        from_document = RecipeSerializer(
+            recipe, context={**self.context, 'recipe_documents': True}).data
+        if serialized != from_document:
+            # Формат документа разошёлся с сериализатором.
+            return 'format'
+        return None
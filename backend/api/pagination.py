@@ -1,6 +1,86 @@
+import base64
+from datetime import datetime
+from functools import partial
+
+from django.core.paginator import Paginator
+from django.db.models import QuerySet
+from django_filters import BooleanFilter
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from foodgram.paginators import CachedCountPaginator
+
+# Фильтры и действия, выборка которых зависит от пользователя.
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+USER_ACTIONS = ('subscriptions',)
+
+
+def is_true(value):
+    """Значение параметра так, как его разбирает BooleanFilter."""
+    return BooleanFilter.field_class().to_python(value) is True
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничный вывод с кэшированным полем count."""
     page_size = 6
     page_size_query_param = 'limit'
+
+    def get_count_scopes(self, queryset, request, view):
+        scopes = [queryset.model._meta.label_lower]
+        user_filtered = (
+            getattr(view, 'action', None) in USER_ACTIONS
+            or any(is_true(request.query_params.get(name))
+                   for name in USER_FILTERS))
+        if user_filtered and request.user.is_authenticated:
+            scopes.append(f'user-{request.user.pk}')
+        return scopes
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Готовые списки (например, cookable) считаются через len().
+        self.django_paginator_class = Paginator
+        if isinstance(queryset, QuerySet):
+            self.django_paginator_class = partial(
+                CachedCountPaginator,
+                scopes=self.get_count_scopes(queryset, request, view))
+        return super().paginate_queryset(queryset, request, view)
+
+
+class FeedPagination:
+    """Keyset-пагинация ленты по (pub_date, id) с непрозрачным курсором."""
+    page_size = 6
+    max_page_size = 100
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, pk = base64.urlsafe_b64decode(
+                encoded.encode()).decode().rsplit('|', 1)
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound('Неверный курсор.')
+
+    def encode_cursor(self, pub_date, pk):
+        return base64.urlsafe_b64encode(
+            f'{pub_date.isoformat()}|{pk}'.encode()).decode()
+
+    def get_paginated_response(self, request, data, next_key):
+        url = remove_query_param(
+            request.build_absolute_uri(), self.cursor_query_param)
+        return Response({
+            'next': next_key and replace_query_param(
+                url, self.cursor_query_param, self.encode_cursor(*next_key)),
+            'results': data,
+        })
@@ -1,19 +1,25 @@
 import base64
 
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
 from django.core.files.base import ContentFile
 from django.core.validators import RegexValidator
+from django.db import IntegrityError
+from django.utils.functional import cached_property
 from djoser.serializers import (UserCreateSerializer
                                 as DjoserUserCreateSerializer,
                                 UserSerializer
                                 as DjoserUserSerializer)
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.validators import UniqueValidator
 
-from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
-                            RecipeIngredient, ShortLink, ShoppingCart,
-                            Tag)
+from recipes.constants import (COOKABLE_MAX_INGREDIENTS,
+                               COOKABLE_MAX_MISSING, MAX_BULK_RECIPES)
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShortLink, Tag)
 from users.models import Follow, User
+from .services import flags_from_sets, get_user_flags
 
 
 class Base64ImageField(serializers.ImageField):
@@ -26,13 +32,81 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
-class UserSerializer(DjoserUserCreateSerializer, DjoserUserSerializer):
+def parse_field_paths(value):
+    """Дерево полей из строки «id,name,author.username»."""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, path.strip().split('.')):
+            node = node.setdefault(name, {})
+    return tree
+
+
+class SparseFieldsMixin:
+    """Выбор полей ответа параметрами ?fields=, ?omit= и ?expand=.
+
+    Поля перечисляются через запятую, поля вложенных объектов — через
+    точку (author.username). При заданном fields связи из
+    expandable_fields выводятся как id, пока не указаны в expand.
+    Исключённые поля не вычисляются, а вьюсеты по fields сериализатора
+    решают, какие связи подгружать. Параметры действуют только
+    на запросы чтения, чтобы не менять набор полей при записи.
+    """
+    expandable_fields = {}
+
+    def get_field_path(self):
+        path, node = [], self
+        while node.parent is not None:
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        return path[::-1]
+
+    def get_field_trees(self):
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        params = getattr(request, 'query_params', request.GET)
+        trees = [parse_field_paths(params[name]) if params.get(name)
+                 else None for name in ('fields', 'omit', 'expand')]
+        if trees == [None, None, None]:
+            return None
+        path = self.get_field_path()
+        for index, tree in enumerate(trees):
+            for name in path:
+                if tree is None or not tree:
+                    break
+                tree = tree.get(name)
+            trees[index] = tree
+        return trees
+
+    def get_fields(self):
+        fields = super().get_fields()
+        trees = self.get_field_trees()
+        if trees is None:
+            return fields
+        only, omit, expand = trees
+        for name in list(fields):
+            if ((only and name not in only)
+                    or (omit and name in omit and not omit[name])):
+                del fields[name]
+        if only is None:
+            return fields
+        for name, collapsed in self.expandable_fields.items():
+            if (name in fields and not only.get(name)
+                    and name not in (expand or {})):
+                fields[name] = collapsed()
+        return fields
+
+
+class UserSerializer(SparseFieldsMixin, DjoserUserCreateSerializer,
+                     DjoserUserSerializer):
     """Сериализатор для создания и обновления пользователя."""
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(required=False)
 
-    email = serializers.EmailField(
-        validators=[UniqueValidator(queryset=User.objects.all())])
+    # Уникальность email и username проверяет ограничение БД при вставке.
+    email = serializers.EmailField()
     username = serializers.CharField(
         max_length=150,
         validators=[
@@ -41,8 +115,7 @@ class UserSerializer(DjoserUserCreateSerializer, DjoserUserSerializer):
                 message=('Username должен содержать только буквы, цифры '
                          ' и следующие символы: @/./+/-/_'),
                 code='invalid_username'
-            ),
-            UniqueValidator(queryset=User.objects.all())])
+            )])
 
     class Meta:
         model = User
@@ -61,13 +134,29 @@ class UserSerializer(DjoserUserCreateSerializer, DjoserUserSerializer):
         user = self.context.get('request').user
         if not user.is_authenticated:
             return False
-        return obj.following.filter(user=user, author=obj).exists()
+        # Подписки загружаются раз за запрос, а не запросом на автора.
+        return obj.pk in get_user_flags(self.context['request']).following
 
     def validate(self, attrs):
         if 'password' in attrs and 'user' in self.context:
             validate_password(attrs['password'], self.context['user'])
         return attrs
 
+    def create(self, validated_data):
+        try:
+            return self.perform_create(validated_data)
+        except IntegrityError:
+            # Занятые поля ищутся только после отказа БД.
+            errors = {
+                field: [UniqueValidator.message]
+                for field in ('email', 'username')
+                if User.objects.filter(
+                    **{field: validated_data[field]}).exists()
+            }
+            if not errors:
+                self.fail('cannot_create_user')
+            raise serializers.ValidationError(errors)
+
     def update(self, instance, validated_data):
         instance.avatar = validated_data.get('avatar', instance.avatar)
         instance.save()
@@ -112,7 +201,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для рецепта."""
     tags = TagSerializer(read_only=True, many=True)
     image = Base64ImageField()
@@ -125,6 +214,13 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.BooleanField(
         read_only=True, default=False)
 
+    expandable_fields = {
+        'author': lambda: serializers.PrimaryKeyRelatedField(
+            read_only=True),
+        'tags': lambda: serializers.PrimaryKeyRelatedField(
+            read_only=True, many=True),
+    }
+
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
@@ -204,15 +300,68 @@ class RecipeSerializer(serializers.ModelSerializer):
             self.create_ingredients(ingredients, instance)
         return super().update(instance, validated_data)
 
+    @cached_property
+    def document_layout(self):
+        # Порядок ключей в jsonb не сохраняется, он берётся из полей.
+        return {
+            'recipe': list(self.fields),
+            'author': [name for name, field
+                       in self.fields['author'].fields.items()
+                       if not field.write_only],
+            'tags': list(self.fields['tags'].child.fields),
+            'ingredients': list(self.fields['ingredients'].child.fields),
+        }
+
+    def get_document(self, instance):
+        if not self.context.get('recipe_documents'):
+            return None
+        document = getattr(instance, 'document', None)
+        return document.data if document else None
+
+    def from_document(self, document, instance):
+        """Ответ из готового документа рецепта.
+
+        Флаги избранного и корзины остаются False и проставляются
+        дальше как обычно, подписка на автора берётся из подписок
+        пользователя, загруженных раз за запрос.
+        """
+        request = self.context['request']
+        layout = self.document_layout
+        data = {name: document.get(name, False) for name in layout['recipe']}
+        for name in ('tags', 'ingredients'):
+            data[name] = [{key: item[key] for key in layout[name]}
+                          for item in document[name]]
+        author = data['author'] = {
+            name: document['author'].get(name) for name in layout['author']}
+        author['is_subscribed'] = (
+            request.user.is_authenticated
+            and instance.author_id in get_user_flags(request).following)
+        for item, name in ((data, 'image'), (author, 'avatar')):
+            if item[name]:
+                item[name] = request.build_absolute_uri(item[name])
+        return data
+
     def to_representation(self, instance):
-        representation = super().to_representation(instance)
+        document = self.get_document(instance)
+        if document is not None:
+            representation = self.from_document(document, instance)
+        else:
+            representation = super().to_representation(instance)
         include_extra_fields = self.context.get('include_extra_fields', False)
         if include_extra_fields:
-            user = self.context['request'].user
-            if user.is_authenticated:
-                representation['is_favorited'] = instance.is_favorited
-                representation['is_in_shopping_cart'] = (
-                    instance.is_in_shopping_cart)
+            request = self.context['request']
+            if request.user.is_authenticated and flags_from_sets():
+                flags = get_user_flags(request)
+                if 'is_favorited' in representation:
+                    representation['is_favorited'] = (
+                        instance.pk in flags.favorites)
+                if 'is_in_shopping_cart' in representation:
+                    representation['is_in_shopping_cart'] = (
+                        instance.pk in flags.cart)
+            elif request.user.is_authenticated:
+                for name in ('is_favorited', 'is_in_shopping_cart'):
+                    if name in representation:
+                        representation[name] = getattr(instance, name)
         return representation
 
 
@@ -226,46 +375,45 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Сериализатор для избранного."""
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для массовых операций."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES
+    )
 
-    class Meta:
-        model = FavoriteRecipe
-        fields = (
-            'user',
-            'recipe',
-        )
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=FavoriteRecipe.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт уже в избранном!'
-            )
-        ]
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
 
-    def to_representation(self, instance):
-        return ShortRecipeSerializer(instance.recipe).data
 
+class CookableSerializer(serializers.Serializer):
+    """Параметры поиска рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=COOKABLE_MAX_INGREDIENTS
+    )
+    max_missing = serializers.IntegerField(
+        min_value=0, default=COOKABLE_MAX_MISSING)
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор для списка покупок."""
 
-    class Meta:
-        model = ShoppingCart
-        fields = (
-            'user',
-            'recipe',
-        )
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=ShoppingCart.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт уже добавлен в список покупок!'
-            )
-        ]
+class BatchItemSerializer(serializers.Serializer):
+    """Подзапрос пакета."""
+    method = serializers.ChoiceField(
+        choices=('GET', 'POST', 'PUT', 'PATCH', 'DELETE'))
+    path = serializers.RegexField(r'^/api/')
+    body = serializers.JSONField(required=False, allow_null=True)
 
-    def to_representation(self, instance):
-        return ShortRecipeSerializer(instance.recipe).data
+
+class BatchSerializer(serializers.Serializer):
+    """Пакет подзапросов к API."""
+    requests = serializers.ListField(
+        child=BatchItemSerializer(),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_REQUESTS
+    )
+    parallel = serializers.BooleanField(default=False)
 
 
 class ShortLinkSerializer(serializers.ModelSerializer):
@@ -275,7 +423,7 @@ class ShortLinkSerializer(serializers.ModelSerializer):
         fields = ('__all__',)
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для подписок."""
     id = serializers.ReadOnlyField(
         source='author.id')
@@ -304,17 +452,25 @@ class FollowSerializer(serializers.ModelSerializer):
         return None
 
     def get_is_subscribed(self, obj):
-        return obj.user.following.filter(author=obj.author).exists()
+        request = self.context.get('request')
+        if obj.user_id == request.user.pk:
+            return True
+        return obj.author_id in get_user_flags(request).following
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.query_params.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.author)
-        if limit:
-            queryset = queryset[:int(limit)]
+        queryset = getattr(obj.author, 'short_recipes', None)
+        if queryset is None:
+            request = self.context.get('request')
+            limit = request.query_params.get('recipes_limit')
+            queryset = Recipe.objects.filter(author=obj.author)
+            if limit:
+                queryset = queryset[:int(limit)]
         return ShortRecipeSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
+        recipes_count = getattr(obj, 'recipes_count', None)
+        if recipes_count is not None:
+            return recipes_count
         return Recipe.objects.filter(author=obj.author).count()
 
     def validate_id(self, value):
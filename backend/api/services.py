@@ -1,8 +1,20 @@
-from django.db.models import Exists, OuterRef
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Exists, OuterRef
 from django.http import HttpResponseNotFound
 from django.shortcuts import redirect
+from django.utils import timezone
+from django.utils.functional import cached_property
 
-from recipes.models import FavoriteRecipe, ShortLink, ShoppingCart
+from foodgram.paginators import counts_changed
+from recipes.constants import USER_FLAGS_MAX_IN
+from recipes.feed import backfill_feed, trim_feed
+from recipes.models import FavoriteRecipe, Recipe, ShortLink, ShoppingCart
+from recipes.tags import get_tag_map
+from recipes.user_recipes import get_user_recipe_ids, user_recipes_changed
+from users.models import Follow, User
+
+SHORT_RECIPE_FIELDS = ('id', 'name', 'image', 'cooking_time')
 
 
 def redirection(request, short_url):
@@ -13,16 +25,229 @@ def redirection(request, short_url):
         return HttpResponseNotFound(f'Страница не найдена - {short_url}')
 
 
-def annotate_recipes_with_user_flags(queryset, user):
-    return queryset.annotate(
-        is_favorited=Exists(
-            FavoriteRecipe.objects.filter(
-                user=user, recipe=OuterRef('pk')
-            )
-        ),
-        is_in_shopping_cart=Exists(
-            ShoppingCart.objects.filter(
-                user=user, recipe=OuterRef('pk')
-            )
-        )
-    )
+USER_FLAG_MODELS = {
+    'is_favorited': FavoriteRecipe,
+    'is_in_shopping_cart': ShoppingCart,
+}
+
+
+def annotate_recipes_with_user_flags(queryset, user,
+                                     flags=tuple(USER_FLAG_MODELS)):
+    return queryset.annotate(**{
+        flag: Exists(USER_FLAG_MODELS[flag].objects.filter(
+            user=user, recipe=OuterRef('pk')))
+        for flag in flags
+    })
+
+
+def flags_from_sets():
+    """Флаги считаются по множествам id, а не подзапросами EXISTS."""
+    return settings.USER_FLAGS_ENGINE == 'sets'
+
+
+class UserRecipeFlags:
+    """Избранное, корзина и подписки пользователя, загружаемые раз
+    за запрос."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    @cached_property
+    def favorites(self):
+        return get_user_recipe_ids(FavoriteRecipe, self.user_id)
+
+    @cached_property
+    def cart(self):
+        return get_user_recipe_ids(ShoppingCart, self.user_id)
+
+    @cached_property
+    def following(self):
+        return frozenset(Follow.objects.filter(
+            user_id=self.user_id).values_list('author_id', flat=True))
+
+
+def get_user_flags(request):
+    flags = getattr(request, 'user_recipe_flags', None)
+    if flags is None:
+        flags = request.user_recipe_flags = UserRecipeFlags(request.user.pk)
+    return flags
+
+
+def filter_user_recipes(queryset, model, user, recipe_ids):
+    """Рецепты из избранного/корзины пользователя.
+
+    Небольшое множество подставляется списком id, большое — полусоединением
+    по уникальному индексу (user, recipe).
+    """
+    if len(recipe_ids) <= USER_FLAGS_MAX_IN:
+        return queryset.filter(pk__in=recipe_ids)
+    return queryset.filter(pk__in=model.objects.filter(
+        user=user).values('recipe_id'))
+
+
+def tag_facets(queryset):
+    """Число найденных рецептов по каждому тегу одним GROUP BY."""
+    slugs = {tag_id: slug for slug, tag_id in get_tag_map().items()}
+    counts = Recipe.tags.through.objects.filter(
+        recipe__in=queryset.order_by().values('pk')
+    ).values_list('tag_id').annotate(
+        count=Count('recipe_id')).order_by('tag_id')
+    return {slugs[tag_id]: count for tag_id, count in counts
+            if tag_id in slugs}
+
+
+def table_and_columns(model, *fields):
+    """Имя таблицы и колонок модели, экранированные для raw SQL."""
+    quote = connection.ops.quote_name
+    return (quote(model._meta.db_table),
+            *(quote(model._meta.get_field(field).column)
+              for field in fields))
+
+
+def add_user_recipe(model, user, recipe_id):
+    """Добавление рецепта в избранное/корзину.
+
+    Возвращает (рецепт, создана ли запись); рецепт — None, если его
+    не существует. В PostgreSQL выполняется одним запросом
+    INSERT ... ON CONFLICT DO NOTHING RETURNING, дубликаты отсекает
+    ограничение уникальности, а не предварительная проверка.
+    """
+    if connection.vendor != 'postgresql':
+        recipe = Recipe.objects.only(*SHORT_RECIPE_FIELDS).filter(
+            pk=recipe_id).first()
+        if recipe is None:
+            return None, False
+        try:
+            with transaction.atomic():
+                model.objects.create(user=user, recipe=recipe)
+        except IntegrityError:
+            return recipe, False
+        return recipe, True
+    table, user_column, recipe_column, created_column = table_and_columns(
+        model, 'user', 'recipe', 'created')
+    recipe_table = connection.ops.quote_name(Recipe._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH recipe AS ('
+            f'SELECT {", ".join(SHORT_RECIPE_FIELDS)} FROM {recipe_table} '
+            f'WHERE id = %s), '
+            f'inserted AS ('
+            f'INSERT INTO {table} '
+            f'({user_column}, {recipe_column}, {created_column}) '
+            f'SELECT %s, id, %s FROM recipe '
+            f'ON CONFLICT DO NOTHING RETURNING {recipe_column}) '
+            f'SELECT recipe.*, EXISTS(SELECT 1 FROM inserted) FROM recipe',
+            [recipe_id, user.pk, timezone.now()])
+        row = cursor.fetchone()
+    if row is None:
+        return None, False
+    if row[-1]:
+        user_recipes_changed(model, user.pk)
+    return Recipe.from_db(connection.alias, SHORT_RECIPE_FIELDS,
+                          row[:-1]), row[-1]
+
+
+def remove_user_recipe(model, user, recipe_id):
+    """Удаление рецепта из избранного/корзины.
+
+    Возвращает (существует ли рецепт, удалена ли запись). В PostgreSQL
+    выполняется одним запросом DELETE ... RETURNING.
+    """
+    if connection.vendor != 'postgresql':
+        deleted, _ = model.objects.filter(
+            user=user, recipe_id=recipe_id).delete()
+        if deleted:
+            return True, True
+        return Recipe.objects.filter(pk=recipe_id).exists(), False
+    table, user_column, recipe_column = table_and_columns(
+        model, 'user', 'recipe')
+    recipe_table = connection.ops.quote_name(Recipe._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH deleted AS ('
+            f'DELETE FROM {table} '
+            f'WHERE {user_column} = %s AND {recipe_column} = %s '
+            f'RETURNING {recipe_column}) '
+            f'SELECT EXISTS(SELECT 1 FROM {recipe_table} WHERE id = %s), '
+            f'EXISTS(SELECT 1 FROM deleted)',
+            [user.pk, recipe_id, recipe_id])
+        recipe_exists, deleted = cursor.fetchone()
+    if deleted:
+        user_recipes_changed(model, user.pk)
+    return recipe_exists, deleted
+
+
+def add_follow(user, author_id):
+    """Подписка на автора.
+
+    Возвращает (автор, подписка) или (None, None), если автора нет;
+    подписка — None, если она уже существовала. Подписка на самого
+    себя отсекается условием запроса.
+    """
+    if connection.vendor != 'postgresql':
+        author = User.objects.filter(pk=author_id).first()
+        if author is None or author == user:
+            return author, None
+        try:
+            with transaction.atomic():
+                return author, Follow.objects.create(user=user,
+                                                     author=author)
+        except IntegrityError:
+            return author, None
+    table, user_column, author_column = table_and_columns(
+        Follow, 'user', 'author')
+    user_table = connection.ops.quote_name(User._meta.db_table)
+    fields = [field.attname for field in User._meta.concrete_fields]
+    columns = ', '.join(connection.ops.quote_name(field.column)
+                        for field in User._meta.concrete_fields)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH author AS ('
+            f'SELECT {columns} FROM {user_table} WHERE id = %s), '
+            f'inserted AS ('
+            f'INSERT INTO {table} ({user_column}, {author_column}) '
+            f'SELECT %s, id FROM author WHERE id <> %s '
+            f'ON CONFLICT DO NOTHING RETURNING id) '
+            f'SELECT author.*, (SELECT id FROM inserted) FROM author',
+            [author_id, user.pk, user.pk])
+        row = cursor.fetchone()
+    if row is None:
+        return None, None
+    author = User.from_db(connection.alias, fields, row[:-1])
+    if row[-1] is None:
+        return author, None
+    # raw SQL не отправляет post_save, ленту заполняем явно.
+    backfill_feed(user.pk, author.pk)
+    counts_changed(f'user-{user.pk}')
+    return author, Follow(id=row[-1], user=user, author=author)
+
+
+def remove_follow(user, author_id):
+    """Отписка от автора.
+
+    Возвращает (существует ли автор, удалена ли подписка). В PostgreSQL
+    выполняется одним запросом DELETE ... RETURNING.
+    """
+    if connection.vendor != 'postgresql':
+        deleted, _ = Follow.objects.filter(
+            user=user, author_id=author_id).delete()
+        if deleted:
+            return True, True
+        return User.objects.filter(pk=author_id).exists(), False
+    table, user_column, author_column = table_and_columns(
+        Follow, 'user', 'author')
+    user_table = connection.ops.quote_name(User._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH deleted AS ('
+            f'DELETE FROM {table} '
+            f'WHERE {user_column} = %s AND {author_column} = %s '
+            f'RETURNING id) '
+            f'SELECT EXISTS(SELECT 1 FROM {user_table} WHERE id = %s), '
+            f'EXISTS(SELECT 1 FROM deleted)',
+            [user.pk, author_id, author_id])
+        author_exists, deleted = cursor.fetchone()
+    if deleted:
+        trim_feed(user.pk, author_id)
+        counts_changed(f'user-{user.pk}')
+    return author_exists, deleted
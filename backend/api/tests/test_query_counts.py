@@ -0,0 +1,139 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from recipes.documents import refresh_documents
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeDocument, RecipeIngredient, ShoppingCart,
+                            Tag)
+from users.models import Follow, User
+
+RECIPES = 12
+
+
+class QueryCountTests(APITestCase):
+    """Число SQL-запросов горячих действий API.
+
+    Число не должно зависеть от размера страницы: рост означает
+    запросы на каждый объект (N+1).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com',
+            first_name='Имя', last_name='Фамилия')
+        cls.authors = [
+            User.objects.create(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                first_name='Имя', last_name='Фамилия')
+            for number in range(3)]
+        tags = [Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+                for number in range(3)]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(6)]
+        for number in range(RECIPES):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % 3], name=f'Рецепт {number}',
+                image='recipes/test.png', text='Описание', cooking_time=5)
+            recipe.tags.set(tags[:number % 3 + 1])
+            for ingredient in ingredients[number % 2::2]:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=10)
+            if number % 2:
+                FavoriteRecipe.objects.create(user=cls.user, recipe=recipe)
+            if number % 3 == 0:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+        cls.recipe = Recipe.objects.first()
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, path):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(captured)
+
+    def assertPageIndependent(self, path):
+        """Одинаковое число запросов для страниц из 2 и 10 объектов."""
+        separator = '&' if '?' in path else '?'
+        small = self.count_queries(f'{path}{separator}limit=2')
+        large = self.count_queries(f'{path}{separator}limit=10')
+        self.assertEqual(small, large, f'{path}: {small} и {large}')
+
+    def test_tags(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/tags/')
+
+    def test_ingredient_search(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/ingredients/', {'name': 'ингр'})
+
+    def test_recipe_list_anonymous(self):
+        # Оценка и точное число объектов, страница с авторами, теги,
+        # ингредиенты рецептов и сами ингредиенты.
+        with self.assertNumQueries(6):
+            self.client.get('/api/recipes/')
+        self.assertPageIndependent('/api/recipes/')
+
+    def test_recipe_list_authenticated(self):
+        self.client.force_authenticate(self.user)
+        self.assertPageIndependent('/api/recipes/')
+        self.assertPageIndependent('/api/recipes/?is_favorited=1')
+        self.assertPageIndependent('/api/recipes/?tags=tag0&tags=tag1')
+
+    def test_recipe_list_count_is_cached(self):
+        self.client.get('/api/recipes/')
+        with self.assertNumQueries(4):
+            self.client.get('/api/recipes/')
+
+    def test_recipe_detail(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(5):
+            self.client.get(f'/api/recipes/{self.recipe.pk}/')
+
+    def test_subscriptions(self):
+        self.client.force_authenticate(self.user)
+        self.assertPageIndependent(
+            '/api/users/subscriptions/?recipes_limit=2')
+        response = self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': 2})
+        for item in response.data['results']:
+            self.assertTrue(item['is_subscribed'])
+            self.assertEqual(
+                [recipe['id'] for recipe in item['recipes']],
+                list(Recipe.objects.filter(author_id=item['id']).values_list(
+                    'pk', flat=True)[:2]))
+
+    def test_users_list(self):
+        self.client.force_authenticate(self.user)
+        self.assertPageIndependent('/api/users/')
+
+    @override_settings(RECIPE_DOCUMENTS=True)
+    def test_recipe_list_from_documents(self):
+        refresh_documents(Recipe.objects.values_list('pk', flat=True))
+        with self.assertNumQueries(3):
+            self.client.get('/api/recipes/')
+        self.assertPageIndependent('/api/recipes/')
+
+    @override_settings(RECIPE_DOCUMENTS=True)
+    def test_recipes_without_documents_load_per_page(self):
+        refresh_documents(Recipe.objects.values_list('pk', flat=True))
+        RecipeDocument.objects.filter(
+            recipe__in=Recipe.objects.all()[:5]).delete()
+        self.assertPageIndependent('/api/recipes/')
+        with_documents = self.client.get('/api/recipes/?limit=10').content
+        with override_settings(RECIPE_DOCUMENTS=False):
+            cache.clear()
+            serialized = self.client.get('/api/recipes/?limit=10').content
+        self.assertEqual(with_documents, serialized)
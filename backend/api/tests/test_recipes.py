@@ -0,0 +1,110 @@
+from unittest import mock
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api import views
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from users.models import User
+
+COOKABLE_URL = '/api/recipes/cookable/'
+
+
+class CookableTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com',
+            first_name='Имя', last_name='Фамилия')
+        cls.breakfast = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.dinner = Tag.objects.create(name='Ужин', slug='dinner')
+        cls.egg, cls.milk, cls.salt = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('яйцо', 'молоко', 'соль'))
+        cls.recipes = []
+        for number in range(4):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}',
+                image='recipes/test.png', text='Описание', cooking_time=5)
+            recipe.tags.set(
+                [cls.breakfast if number == 0 else cls.dinner])
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=cls.egg, amount=2)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        # Индекс процесса переживает откат транзакции теста.
+        ingredient_index.built_at = None
+
+    def cookable(self, **params):
+        return self.client.get(COOKABLE_URL, {
+            'ingredients': [self.egg.pk], 'max_missing': 0, **params})
+
+    def test_cookable_returns_paginated_ranking(self):
+        response = self.cookable()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], len(self.recipes))
+        self.assertEqual(
+            response.data['results'][0]['missing_ingredients'], 0)
+
+    def test_cookable_filters_before_ranking(self):
+        with mock.patch.object(views, 'COOKABLE_MAX_RESULTS', 1):
+            response = self.cookable(tags='breakfast')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         [self.recipes[0].pk])
+
+    def test_cookable_sees_orm_changes(self):
+        salt = {'ingredients': [self.salt.pk], 'max_missing': 1}
+        self.assertEqual(self.cookable(**salt).data['count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(
+                recipe=self.recipes[1], ingredient=self.salt, amount=1)
+        response = self.cookable(**salt)
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         [self.recipes[1].pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[1].delete()
+        self.assertEqual(self.cookable(**salt).data['count'], 0)
+
+    def test_cookable_requires_ingredients(self):
+        response = self.client.get(COOKABLE_URL)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FavoriteTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='user', email='user@example.com',
+            first_name='Имя', last_name='Фамилия')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', image='recipes/test.png',
+            text='Описание', cooking_time=5)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/recipes/{self.recipe.pk}/favorite/'
+
+    def test_favorite_toggle(self):
+        self.assertEqual(self.client.post(self.url).status_code,
+                         status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post(self.url).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(FavoriteRecipe.objects.filter(
+            user=self.user, recipe=self.recipe).exists())
+        self.assertEqual(self.client.delete(self.url).status_code,
+                         status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.delete(self.url).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_favorite_missing_recipe(self):
+        response = self.client.post('/api/recipes/0/favorite/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.urls import include, path
 
+from djoser.urls import authtoken
+from djoser.views import TokenCreateView
 from rest_framework.routers import DefaultRouter
 
-from .views import (IngredientViewSet, RecipeViewSet, TagViewSet,
-                    UserViewSet)
+from .batch import BatchView
+from .views import (IngredientViewSet, ProfileCaptureViewSet, RecipeViewSet,
+                    TagViewSet, UserViewSet)
 
 app_name = 'api'
 
@@ -12,9 +16,28 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet)
 router.register('recipes', RecipeViewSet, basename='follow')
 router.register('users', UserViewSet, basename='users')
+router.register('profiles', ProfileCaptureViewSet, basename='profiles')
+
+router_urls = router.urls
+auth_urls = authtoken.urlpatterns
+if settings.ASYNC_API:
+    from .async_views import asyncify_patterns, hash_executor
+
+    router_urls = asyncify_patterns(router_urls, {
+        RecipeViewSet: ('list', 'retrieve', 'favorite', 'shopping_cart'),
+        IngredientViewSet: ('list', 'retrieve'),
+    })
+    # Регистрация и вход хешируют пароль в отдельном пуле.
+    router_urls = asyncify_patterns(router_urls, {
+        UserViewSet: ('create', 'set_password'),
+    }, hash_executor)
+    auth_urls = asyncify_patterns(auth_urls, {
+        TokenCreateView: ('post',),
+    }, hash_executor)
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('batch/', BatchView.as_view()),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
-    path('auth/', include('djoser.urls.authtoken')),
+    path('auth/', include(auth_urls)),
 ]
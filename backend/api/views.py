@@ -1,36 +1,63 @@
 import hashlib
+from datetime import datetime
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse, JsonResponse
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import (Count, Exists, OuterRef, Prefetch, Subquery,
+                              Sum)
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status, exceptions, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (AllowAny, IsAuthenticated,
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
-
+from rest_framework.settings import api_settings
+
+from foodgram.edge_cache import EdgeCacheMixin
+from foodgram.profiling import capture_path, list_captures
+from recipes.constants import COOKABLE_MAX_RESULTS, SIMILAR_TOP_K
+from recipes.documents import flush_documents, load_missing_documents
+from recipes.feed import get_feed_page
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
                             RecipeIngredient, ShoppingCart, ShortLink, Tag)
+from recipes.similarity import schedule_neighbors_update
+from recipes.user_recipes import user_recipes_changed
 from users.models import Follow
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .pagination import CustomPagination, FeedPagination
 from .permissions import OwnerOrReadOnly
-from .serializers import (FavoriteSerializer, FollowSerializer,
-                          IngredientSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, TagSerializer,
+from .serializers import (CookableSerializer, FollowSerializer,
+                          IngredientSerializer,
+                          RecipeIdsSerializer, RecipeSerializer,
+                          ShortRecipeSerializer, TagSerializer,
                           UserSerializer)
-from .services import annotate_recipes_with_user_flags
+from .services import (SHORT_RECIPE_FIELDS, USER_FLAG_MODELS, add_follow,
+                       add_user_recipe, annotate_recipes_with_user_flags,
+                       flags_from_sets, remove_follow, remove_user_recipe,
+                       tag_facets)
 
 
 User = get_user_model()
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+def parse_pk(pk):
+    """Первичный ключ из URL; 404 для нечисловых значений."""
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        raise Http404
+
+
+class IngredientViewSet(EdgeCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет ингредиентов."""
+    surrogate_key = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filterset_class = IngredientFilter
@@ -38,14 +65,16 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ('^name',)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(EdgeCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет Тегов."""
+    surrogate_key = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(EdgeCacheMixin, viewsets.ModelViewSet):
     """Вьюсет рецептов."""
+    surrogate_key = 'recipes'
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     pagination_class = CustomPagination
@@ -53,54 +82,165 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_surrogate_keys(self):
+        keys = super().get_surrogate_keys()
+        author = self.request.query_params.get('author', '')
+        if self.action == 'list' and author.isdigit():
+            keys.append(f'authors-{author}')
+        return keys
+
+    def use_documents(self):
+        """Ответ собирается из готовых документов рецептов.
+
+        Только для списка и карточки без выбора полей ответа.
+        """
+        params = self.request.query_params
+        return (settings.RECIPE_DOCUMENTS
+                and self.action in ('list', 'retrieve')
+                and not any(params.get(name)
+                            for name in ('fields', 'omit', 'expand')))
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.use_documents():
+            load_missing_documents(page)
+        return page
+
+    def get_object(self):
+        recipe = super().get_object()
+        if self.use_documents():
+            load_missing_documents([recipe])
+        return recipe
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        context['include_extra_fields'] = (self.action == 'retrieve'
-                                           or self.action == 'list')
+        context['include_extra_fields'] = self.action in (
+            'retrieve', 'list', 'feed', 'cookable')
+        context['recipe_documents'] = self.use_documents()
         return context
 
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets') in ('1', 'true'):
+            response.data['facets'] = {'tags': tag_facets(
+                self.filter_queryset(self.get_queryset()))}
+        return response
+
+    @staticmethod
+    def recipe_changed(recipe_id):
+        """Пересчёт похожих рецептов после фиксации транзакции."""
+        transaction.on_commit(lambda: schedule_neighbors_update(recipe_id))
+
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        # Рецепт с ингредиентами фиксируется целиком, поэтому обработчики
+        # после фиксации (в том числе обновление кэша nginx) видят его
+        # полностью.
+        with transaction.atomic():
+            recipe = serializer.save(author=self.request.user)
+            flush_documents()
+        self.recipe_changed(recipe.pk)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            recipe = serializer.save()
+            flush_documents()
+        self.recipe_changed(recipe.pk)
 
     def get_queryset(self):
-        queryset = Recipe.objects.select_related('author').prefetch_related(
-            'tags', 'ingredients')
+        # Связи и флаги загружаются, только если поле есть в ответе
+        # (см. ?fields= и ?omit=) или по нему фильтруют.
+        fields = self.get_serializer().fields
+        queryset = Recipe.objects.all()
+        if self.use_documents():
+            # Автор, теги, ингредиенты и описание есть в документе;
+            # рецептам без документа они догружаются после выборки.
+            queryset = queryset.select_related('document').defer('text')
+        else:
+            if isinstance(fields.get('author'), UserSerializer):
+                queryset = queryset.select_related('author')
+            if 'tags' in fields:
+                queryset = queryset.prefetch_related('tags')
+            if 'ingredients' in fields:
+                queryset = queryset.prefetch_related(
+                    'recipeingredient_set__ingredient')
+            if 'text' not in fields:
+                queryset = queryset.defer('text')
         user = self.request.user
-        if user.is_authenticated:
-            queryset = annotate_recipes_with_user_flags(queryset, user)
+        if user.is_authenticated and not flags_from_sets():
+            flags = [flag for flag in USER_FLAG_MODELS
+                     if flag in fields or flag in self.request.query_params]
+            if flags:
+                queryset = annotate_recipes_with_user_flags(
+                    queryset, user, flags)
         return queryset
 
     @staticmethod
-    def add_to_cart_or_favorites(request, pk, serializer_class):
+    def add_to_cart_or_favorites(request, pk, model_class, error_message):
         """Статичный метод для добавления в корзину/избранное."""
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        serializer = serializer_class(data={'user': user.id,
-                                            'recipe': recipe.id})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        recipe, created = add_user_recipe(
+            model_class, request.user, parse_pk(pk))
+        if recipe is None:
+            raise Http404
+        if not created:
+            raise exceptions.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [error_message]})
+        return Response(ShortRecipeSerializer(recipe).data,
+                        status=status.HTTP_201_CREATED)
 
     @staticmethod
     def remove_from_cart_or_favorites(request, pk, model_class):
         """Статичный метод для удаления из корзины/избранного."""
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        try:
-            instance = model_class.objects.get(user=user, recipe=recipe)
-        except model_class.DoesNotExist:
+        recipe_exists, deleted = remove_user_recipe(
+            model_class, request.user, parse_pk(pk))
+        if not recipe_exists:
+            raise Http404
+        if not deleted:
             raise exceptions.ValidationError(
                 'Рецепт не был добавлен в избранное')
-
-        instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def bulk_cart_or_favorites(request, model_class):
+        """Статичный метод для массового добавления/удаления рецептов.
+
+        Все id проверяются одним запросом, затем выполняется одна
+        вставка или одно удаление. Возвращается результат по каждому id.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        user = request.user
+        with transaction.atomic():
+            in_list = dict(Recipe.objects.filter(pk__in=ids).annotate(
+                in_list=Exists(model_class.objects.filter(
+                    user=user, recipe=OuterRef('pk')))
+            ).values_list('pk', 'in_list'))
+            if request.method == 'POST':
+                model_class.objects.bulk_create(
+                    [model_class(user=user, recipe_id=recipe_id)
+                     for recipe_id, exists in in_list.items()
+                     if not exists],
+                    ignore_conflicts=True)
+                user_recipes_changed(model_class, user.pk)
+                statuses = {True: 'exists', False: 'added'}
+            else:
+                model_class.objects.filter(
+                    user=user, recipe_id__in=ids).delete()
+                statuses = {True: 'removed', False: 'missing'}
+        results = [
+            {'id': recipe_id,
+             'status': (statuses[in_list[recipe_id]]
+                        if recipe_id in in_list else 'not_found')}
+            for recipe_id in ids
+        ]
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'],
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
         """Добавление рецепта в избранное."""
         return self.add_to_cart_or_favorites(
-            request, pk, FavoriteSerializer)
+            request, pk, FavoriteRecipe, 'Рецепт уже в избранном!')
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk=None):
@@ -112,13 +252,89 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk=None):
         """Добавление рецепта в корзину."""
         return self.add_to_cart_or_favorites(
-            request, pk, ShoppingCartSerializer)
+            request, pk, ShoppingCart,
+            'Рецепт уже добавлен в список покупок!')
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk=None):
         """Удаление рецепта из корзины."""
         return self.remove_from_cart_or_favorites(request, pk, ShoppingCart)
 
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='favorite/bulk', url_name='favorite-bulk',
+            permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        """Массовое добавление/удаление рецептов в избранном."""
+        return self.bulk_cart_or_favorites(request, FavoriteRecipe)
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart/bulk', url_name='shopping-cart-bulk',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        """Массовое добавление/удаление рецептов в списке покупок."""
+        return self.bulk_cart_or_favorites(request, ShoppingCart)
+
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def similar(self, request, pk=None):
+        """Рецепты, похожие по ингредиентам и тегам."""
+        recipe_id = parse_pk(pk)
+        recipes = Recipe.objects.filter(
+            neighbor_of__recipe_id=recipe_id
+        ).order_by('-neighbor_of__score')[:SIMILAR_TOP_K]
+        if not recipes and not Recipe.objects.filter(pk=recipe_id).exists():
+            raise Http404
+        return Response(ShortRecipeSerializer(recipes, many=True).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def cookable(self, request):
+        """Рецепты, которые можно приготовить из имеющихся ингредиентов.
+
+        Ранжирование по покрытию берётся из инвертированного индекса;
+        фильтры RecipeFilter (теги, автор и т. д.) ограничивают рецепты
+        до ранжирования.
+        """
+        params = CookableSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = self.filter_queryset(self.get_queryset())
+        candidates = None
+        if queryset.query.has_filters():
+            # Ранжируются только прошедшие фильтры рецепты, иначе первые
+            # COOKABLE_MAX_RESULTS могли бы почти все отсеяться.
+            candidates = set(queryset.order_by().values_list(
+                'pk', flat=True))
+        ranked = ingredient_index.search(
+            params.validated_data['ingredients'],
+            params.validated_data['max_missing'],
+            COOKABLE_MAX_RESULTS, candidates)
+        page = self.paginate_queryset(ranked)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in page])
+        data = []
+        for recipe_id, missing in page:
+            if recipe_id not in recipes:
+                # Рецепт удалён, а индекс ещё не обновлён.
+                continue
+            item = self.get_serializer(recipes[recipe_id]).data
+            item['missing_ingredients'] = missing
+            data.append(item)
+        return self.get_paginated_response(data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+        paginator = FeedPagination()
+        limit = paginator.get_page_size(request)
+        page = get_feed_page(request.user, limit + 1,
+                             paginator.decode_cursor(request))
+        next_key = page[limit - 1] if len(page) > limit else None
+        ids = [recipe_id for _, recipe_id in page[:limit]]
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True)
+        return paginator.get_paginated_response(
+            request, serializer.data, next_key)
+
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
@@ -188,7 +404,28 @@ class UserViewSet(DjoserUserViewSet):
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
         """Подписки пользователя."""
-        queryset = Follow.objects.filter(user=request.user)
+        fields = FollowSerializer(context={'request': request}).fields
+        queryset = Follow.objects.filter(user=request.user).select_related(
+            'user', 'author').order_by('-id')
+        if 'recipes_count' in fields:
+            # Подзапрос, а не JOIN с GROUP BY: COUNT(*) страниц его
+            # отбрасывает.
+            queryset = queryset.annotate(recipes_count=Coalesce(Subquery(
+                Recipe.objects.filter(author=OuterRef('author')).order_by()
+                .values('author').annotate(count=Count('pk'))
+                .values('count')), 0))
+        if 'recipes' in fields:
+            # Рецепты всех авторов страницы одним запросом, не больше
+            # recipes_limit на автора.
+            recipes = Recipe.objects.only(*SHORT_RECIPE_FIELDS, 'author')
+            limit = request.query_params.get('recipes_limit')
+            if limit:
+                recipes = recipes.filter(pk__in=Subquery(
+                    Recipe.objects.filter(author=OuterRef('author'))
+                    .values('pk')[:int(limit)]))
+            queryset = queryset.prefetch_related(Prefetch(
+                'author__recipes', queryset=recipes,
+                to_attr='short_recipes'))
         page = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             page, many=True, context={'request': request})
@@ -198,25 +435,30 @@ class UserViewSet(DjoserUserViewSet):
             permission_classes=(IsAuthenticated,))
     def subscribe(self, request, id=None):
         """Подписаться/отписаться от пользователя."""
-        author = get_object_or_404(User, pk=id)
-        serializer = FollowSerializer(data={'user': request.user.id,
-                                            'author': author.id},
-                                      context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save(user=request.user, author=author)
+        author_id = parse_pk(id)
+        if author_id == request.user.pk:
+            raise exceptions.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Нельзя подписаться на самого себя.']})
+        author, follow = add_follow(request.user, author_id)
+        if author is None:
+            raise Http404
+        if follow is None:
+            raise exceptions.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Вы уже подписаны на этого пользователя.']})
+        serializer = FollowSerializer(follow, context={'request': request})
         return Response(serializer.data,
                         status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def delete_subscribe(self, request, id=None):
-        author = get_object_or_404(User, pk=id)
-        try:
-            follow = Follow.objects.get(user=request.user, author=author)
-        except Follow.DoesNotExist:
+        author_exists, deleted = remove_follow(request.user, parse_pk(id))
+        if not author_exists:
+            raise Http404
+        if not deleted:
             return Response({'error': 'Подписка не существует'},
                             status=status.HTTP_400_BAD_REQUEST)
-
-        follow.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=['put', 'patch', 'delete'], detail=False,
@@ -245,3 +487,23 @@ class UserViewSet(DjoserUserViewSet):
             user.save()
             return Response({'message': 'Аватар успешно удален'},
                             status=status.HTTP_204_NO_CONTENT)
+
+
+class ProfileCaptureViewSet(viewsets.ViewSet):
+    """Снимки профилировщика запросов (только для персонала)."""
+    permission_classes = (IsAdminUser,)
+    lookup_value_regex = r'[\w.-]+'
+
+    def list(self, request):
+        return Response([
+            {'name': name, 'size': size,
+             'created': datetime.fromtimestamp(mtime).isoformat()}
+            for name, size, mtime in list_captures()
+        ])
+
+    def retrieve(self, request, pk=None):
+        path = capture_path(pk)
+        if path is None:
+            raise Http404
+        return FileResponse(open(path, 'rb'), as_attachment=True,
+                            filename=pk)
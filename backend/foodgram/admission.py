@@ -0,0 +1,166 @@
+import asyncio
+import fcntl
+import os
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+
+POLL_INTERVAL = 0.02
+# Подписки с небольшим числом рецептов на автора — дешёвый запрос.
+CHEAP_RECIPES_LIMIT = 6
+
+
+class SlotPool:
+    """Ограничение числа одновременных запросов для всех воркеров.
+
+    Слот — файл блокировки в общем каталоге, занятый через flock.
+    Блокировки снимает ядро, даже если процесс завершился аварийно,
+    поэтому слоты не «утекают».
+    """
+
+    def __init__(self, directory, name, size):
+        self.paths = [os.path.join(directory, f'{name}-{number}.lock')
+                      for number in range(size)]
+
+    def try_acquire(self, paths=None):
+        paths = paths or random.sample(self.paths, len(self.paths))
+        for path in paths:
+            descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(descriptor)
+                continue
+            return descriptor
+        return None
+
+    def acquire(self, timeout):
+        """Слот или None, если он не освободился за timeout секунд."""
+        deadline = time.monotonic() + timeout
+        while True:
+            descriptor = self.try_acquire()
+            remaining = deadline - time.monotonic()
+            if descriptor is not None or remaining <= 0:
+                return descriptor
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+    async def aacquire(self, timeout):
+        """Как acquire, но ожидание не блокирует цикл событий."""
+        deadline = time.monotonic() + timeout
+        while True:
+            descriptor = self.try_acquire()
+            remaining = deadline - time.monotonic()
+            if descriptor is not None or remaining <= 0:
+                return descriptor
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+
+    @staticmethod
+    def release(descriptor):
+        fcntl.flock(descriptor, fcntl.LOCK_UN)
+        os.close(descriptor)
+
+
+def get_action(request, view_func):
+    """(путь класса вьюсета, действие) запроса или None."""
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    view_class = getattr(view_func, 'cls', None)
+    if action is None or view_class is None:
+        return None
+    return f'{view_class.__module__}.{view_class.__qualname__}', action
+
+
+def is_cheap_subscriptions(request):
+    limit = request.GET.get('recipes_limit', '')
+    return limit.isdigit() and int(limit) <= CHEAP_RECIPES_LIMIT
+
+
+class AdmissionControlMiddleware:
+    """Ограничение дорогих действий API при перегрузке.
+
+    Действие вьюсета относится к классу из ADMISSION_CLASSES; у класса
+    есть лимит одновременных запросов и время ожидания в очереди. Если
+    слот не освободился вовремя, запрос сразу получает 503 с
+    Retry-After. Остальные запросы не ограничиваются.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ADMISSION_CONTROL:
+            raise MiddlewareNotUsed
+        os.makedirs(settings.ADMISSION_LOCK_DIR, exist_ok=True)
+        self.get_response = get_response
+        self.classes = {}
+        self.pools = {}
+        for name, options in settings.ADMISSION_CLASSES.items():
+            for view_action in options['actions']:
+                self.classes[tuple(view_action)] = name
+            self.pools[name] = SlotPool(
+                settings.ADMISSION_LOCK_DIR, name, options['limit'])
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.admission_slot = None
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(request)
+
+    async def __acall__(self, request):
+        request.admission_slot = None
+        try:
+            return await self.get_response(request)
+        finally:
+            self.release(request)
+
+    @staticmethod
+    def release(request):
+        if request.admission_slot is not None:
+            SlotPool.release(request.admission_slot)
+
+    def get_class(self, request, view_func):
+        view_action = get_action(request, view_func)
+        name = self.classes.get(view_action)
+        if name is None or (view_action[1] == 'subscriptions'
+                            and is_cheap_subscriptions(request)):
+            return None
+        return name
+
+    def admit(self, request, name, descriptor):
+        if descriptor is None:
+            return self.reject(
+                503, 'Сервер перегружен, повторите запрос позже.',
+                settings.ADMISSION_CLASSES[name]['retry_after'])
+        request.admission_slot = descriptor
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = self.get_class(request, view_func)
+        if name is None:
+            return None
+        descriptor = self.pools[name].acquire(
+            settings.ADMISSION_CLASSES[name]['queue_timeout'])
+        return self.admit(request, name, descriptor)
+
+    async def aprocess_view(self, request, view_func, view_args,
+                            view_kwargs):
+        name = self.get_class(request, view_func)
+        if name is None:
+            return None
+        descriptor = await self.pools[name].aacquire(
+            settings.ADMISSION_CLASSES[name]['queue_timeout'])
+        return self.admit(request, name, descriptor)
+
+    @staticmethod
+    def reject(status, detail, retry_after):
+        response = JsonResponse({'detail': detail}, status=status)
+        response['Retry-After'] = str(retry_after)
+        return response
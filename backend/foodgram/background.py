@@ -0,0 +1,44 @@
+import logging
+import queue
+import threading
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundQueue:
+    """Очередь задач процесса с обработчиком в фоновом потоке.
+
+    Запрос только кладёт значение в очередь; накопившиеся значения
+    обрабатываются пачкой без повторов. Поток запускается при первой
+    задаче, необработанные при перезапуске воркера задачи теряются.
+    """
+
+    def __init__(self, name, handler):
+        self.name = name
+        self.handler = handler
+        self.pending = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def put(self, item):
+        self.pending.put(item)
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name=self.name, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            items = {self.pending.get()}
+            while not self.pending.empty():
+                items.add(self.pending.get())
+            try:
+                self.handler(items)
+            except Exception:
+                logger.exception('Фоновая задача %s не выполнена для %s',
+                                 self.name, sorted(items))
+            finally:
+                connection.close()
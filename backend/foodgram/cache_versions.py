@@ -0,0 +1,36 @@
+import secrets
+
+from django.core.cache import cache
+
+
+def new_version():
+    # Случайное начало: после потери ключа версия не повторит прежнюю,
+    # и записи, посчитанные до потери, больше не читаются.
+    return secrets.randbits(48)
+
+
+def get_versions(keys):
+    """Версии из общего кэша; отсутствующие создаются заново.
+
+    Ключи версий хранятся без срока и не вытесняются (volatile-lru).
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, new_version(), None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def get_version(key):
+    return get_versions([key]).get(key)
+
+
+def bump_version(key):
+    """Сдвиг версии: записи под прежней версией больше не читаются."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, new_version(), None)
+        return cache.incr(key)
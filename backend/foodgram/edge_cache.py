@@ -0,0 +1,88 @@
+import logging
+import threading
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+
+logger = logging.getLogger(__name__)
+
+# Адреса, которые nginx обновляет по ключу: у стандартного nginx нет
+# очистки по Surrogate-Key, поэтому перезапрашиваются самые частые
+# адреса, а остальные устаревают не дольше EDGE_CACHE_TTL.
+KEY_PATHS = {
+    'recipes': ('/api/recipes/', '/api/recipes/?page=1&limit=6'),
+    'recipes-{}': ('/api/recipes/{}/',),
+    'authors-{}': ('/api/recipes/?page=1&limit=6&author={}',),
+    'tags': ('/api/tags/',),
+    'tags-{}': ('/api/tags/{}/',),
+    'ingredients': ('/api/ingredients/',),
+}
+PURGE_TIMEOUT = 2
+
+
+def is_edge_cacheable(request, response):
+    return (settings.EDGE_CACHE and request.method in ('GET', 'HEAD')
+            and response.status_code == 200
+            and not request.user.is_authenticated)
+
+
+def add_edge_cache_headers(response, keys):
+    """Кэширование ответа для анонимов на прокси, но не в браузере."""
+    patch_cache_control(
+        response, public=True, max_age=0,
+        s_maxage=settings.EDGE_CACHE_TTL,
+        stale_while_revalidate=settings.EDGE_CACHE_STALE)
+    response['Surrogate-Key'] = ' '.join(keys)
+
+
+def key_paths(keys):
+    paths = []
+    for key in keys:
+        name, separator, argument = key.partition('-')
+        template = f'{name}-{{}}' if separator else name
+        paths.extend(path.format(argument)
+                     for path in KEY_PATHS.get(template, ()))
+    return paths
+
+
+def send_purge(paths):
+    for host in settings.EDGE_CACHE_HOSTS:
+        for path in paths:
+            try:
+                requests.get(settings.EDGE_CACHE_PURGE_URL + path,
+                             headers={'Host': host}, timeout=PURGE_TIMEOUT)
+            except requests.RequestException as error:
+                logger.warning('Не удалось обновить %s%s в кэше nginx: %s',
+                               host, path, error)
+
+
+def purge(*keys):
+    """Обновляет адреса ключей в кэше nginx после фиксации транзакции."""
+    if not settings.EDGE_CACHE or not settings.EDGE_CACHE_PURGE_URL:
+        return
+    paths = key_paths(keys)
+    transaction.on_commit(lambda: threading.Thread(
+        target=send_purge, args=(paths,), daemon=True).start())
+
+
+class EdgeCacheMixin:
+    """Заголовки кэша nginx для анонимных ответов чтения вьюсета."""
+
+    surrogate_key = None
+    edge_cache_actions = ('list', 'retrieve')
+
+    def get_surrogate_keys(self):
+        if self.action == 'retrieve':
+            return [self.surrogate_key,
+                    f'{self.surrogate_key}-{self.kwargs["pk"]}']
+        return [self.surrogate_key]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        if (getattr(self, 'action', None) in self.edge_cache_actions
+                and is_edge_cacheable(request, response)):
+            add_edge_cache_headers(response, self.get_surrogate_keys())
+        return response
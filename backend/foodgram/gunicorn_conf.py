@@ -0,0 +1,101 @@
+"""Настройки gunicorn: gunicorn -c python:foodgram.gunicorn_conf.
+
+Число воркеров считается по доступным контейнеру CPU и памяти, любой
+параметр можно переопределить переменной окружения GUNICORN_*.
+"""
+import os
+import shutil
+
+ASYNC_API = os.getenv('ASYNC_API', 'False').lower() == 'true'
+METRICS_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+
+def read_cgroup(path):
+    try:
+        with open(path) as file:
+            return file.read().split()
+    except OSError:
+        return None
+
+
+def cpu_count():
+    """CPU с учётом квоты cgroup и привязки процесса к ядрам."""
+    cpus = len(os.sched_getaffinity(0))
+    quota = read_cgroup('/sys/fs/cgroup/cpu.max')
+    if quota and quota[0] != 'max':
+        cpus = min(cpus, max(1, int(quota[0]) // int(quota[1])))
+    return cpus
+
+
+def memory_limit():
+    """Лимит памяти контейнера или объём памяти хоста в байтах."""
+    for path in ('/sys/fs/cgroup/memory.max',
+                 '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        limit = read_cgroup(path)
+        if limit and limit[0].isdigit():
+            return min(int(limit[0]), physical_memory())
+    return physical_memory()
+
+
+def physical_memory():
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+
+def default_workers():
+    worker_memory = int(os.getenv('GUNICORN_WORKER_MEMORY_MB', 200)) << 20
+    return max(1, min(2 * cpu_count() + 1,
+                      memory_limit() // worker_memory))
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+if ASYNC_API:
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+    worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+workers = int(os.getenv('GUNICORN_WORKERS', 0)) or default_workers()
+preload_app = True
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Heartbeat воркеров в памяти, а не на overlay-файловой системе.
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+accesslog = '-'
+
+
+def on_starting(server):
+    if workers > 1 and not os.getenv('REDIS_URL'):
+        # Сброс кэша в памяти одного воркера не виден остальным:
+        # токены, теги, счётчики и флаги устаревали бы.
+        raise RuntimeError(
+            'Для нескольких воркеров нужен общий кэш: задайте REDIS_URL '
+            'или GUNICORN_WORKERS=1.')
+    if METRICS_DIR:
+        # Файлы метрик прошлого запуска исказили бы счётчики.
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+        os.makedirs(METRICS_DIR, exist_ok=True)
+
+
+def post_fork(server, worker):
+    from django.conf import settings
+    from django.db import DatabaseError
+
+    from foodgram.warmup import warm_up
+
+    try:
+        # Без пула соединение главного потока нужно только воркеру sync.
+        warm_up(connect=settings.DB_POOL or worker_class == 'sync')
+    except DatabaseError as error:
+        server.log.warning('Прогрев воркера %s прерван: %s',
+                           worker.pid, error)
+
+
+def child_exit(server, worker):
+    if METRICS_DIR:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
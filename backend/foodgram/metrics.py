@@ -0,0 +1,164 @@
+import hmac
+import os
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds', 'Время обработки запроса.',
+    ('view', 'action', 'method'), buckets=LATENCY_BUCKETS)
+REQUESTS = Counter(
+    'foodgram_requests_total', 'Запросы по статусу ответа.',
+    ('view', 'action', 'method', 'status'))
+DB_QUERIES = Histogram(
+    'foodgram_db_queries_per_request', 'Число SQL-запросов на запрос.',
+    ('view', 'action'), buckets=QUERY_COUNT_BUCKETS)
+DB_TIME = Histogram(
+    'foodgram_db_time_per_request_seconds',
+    'Суммарное время SQL-запросов на запрос.',
+    ('view', 'action'), buckets=LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes', 'Размер тела ответа.',
+    ('view', 'action'), buckets=SIZE_BUCKETS)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total', 'Обращения к кэшам приложения.',
+    ('cache', 'result'))
+DB_POOL_ACQUIRES = Counter(
+    'foodgram_db_pool_acquires_total',
+    'Соединения, выданные пулом: новые и повторно использованные.',
+    ('alias', 'result'))
+
+# Счётчик SQL текущего запроса. Контекст копируется и в поток пула, где
+# выполняются синхронные представления в режиме ASGI.
+current_stats = ContextVar('metrics_query_stats', default=None)
+
+
+def record_cache(name, hit):
+    CACHE_REQUESTS.labels(name, 'hit' if hit else 'miss').inc()
+
+
+class QueryStats:
+    """Обёртка выполнения SQL, считающая запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def add_query_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def view_labels(request):
+    """Имя маршрута и действие DRF; число значений ограничено."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved', ''
+    actions = getattr(match.func, 'actions', None) or {}
+    return match.view_name, actions.get(request.method.lower(), '')
+
+
+class MetricsMiddleware:
+    """Гистограммы задержки, SQL-запросов и размера ответа по маршрутам.
+
+    SQL считается обёрткой каждого соединения по счётчику в контексте
+    запроса, поэтому учитываются и запросы из потоков пула ASGI.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(add_query_wrapper)
+        for connection in connections.all():
+            add_query_wrapper(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.observe(request, response, time.perf_counter() - started,
+                     stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.observe(request, response, time.perf_counter() - started,
+                     stats)
+        return response
+
+    @staticmethod
+    def observe(request, response, elapsed, stats):
+        view, action = view_labels(request)
+        method = request.method
+        REQUEST_LATENCY.labels(view, action, method).observe(elapsed)
+        REQUESTS.labels(view, action, method, response.status_code).inc()
+        DB_QUERIES.labels(view, action).observe(stats.count)
+        DB_TIME.labels(view, action).observe(stats.time)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(view, action).observe(len(response.content))
+
+
+def metrics(request):
+    """Метрики в текстовом формате Prometheus.
+
+    С PROMETHEUS_MULTIPROC_DIR значения собираются из файлов всех
+    воркеров. Без METRICS_TOKEN адрес не обслуживается.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    if not hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', ''),
+            f'Bearer {settings.METRICS_TOKEN}'):
+        return HttpResponseForbidden()
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry),
+                        content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,140 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections, transaction
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+from foodgram.cache_versions import bump_version, get_versions
+
+ESTIMATE_THRESHOLD = 10000
+COUNT_VERSION_KEY = 'page-count:{}:version'
+COUNT_KEY = 'page-count:{}'
+COUNT_TTL = 300
+
+
+def estimate_count(queryset):
+    """Оценка числа строк по статистике планировщика PostgreSQL.
+
+    Для запроса без условий берётся reltuples таблицы, иначе — оценка
+    строк из EXPLAIN. Для других СУБД возвращается None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] >= 0 else None
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор с оценочным числом строк для больших выборок.
+
+    Точный COUNT(*) выполняется, только если оценка меньше
+    ESTIMATE_THRESHOLD, — тогда он дешёвый.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = None
+        if hasattr(self.object_list, 'query'):
+            estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            return estimate
+        return super().count
+
+
+def count_queryset(queryset):
+    """Выборка для COUNT(*) без сортировки и вычисляемых полей.
+
+    Условия по аннотациям хранятся в WHERE вместе с выражением, поэтому
+    аннотации без агрегатов можно отбросить.
+    """
+    queryset = queryset.order_by()
+    query = queryset.query
+    query.annotations = {
+        name: annotation for name, annotation in query.annotations.items()
+        if annotation.contains_aggregate}
+    query.set_annotation_mask(query.annotations)
+    return queryset
+
+
+def counts_changed(*scopes):
+    """Сброс закэшированных количеств после фиксации транзакции."""
+    def bump():
+        for scope in scopes:
+            bump_version(COUNT_VERSION_KEY.format(scope))
+    transaction.on_commit(bump)
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор с кэшированным числом строк.
+
+    Число кэшируется по тексту запроса COUNT(*) и версиям областей
+    scopes в общем кэше, которые сдвигаются при изменении данных. Для
+    больших выборок (оценка не меньше ESTIMATE_THRESHOLD) вместо точного
+    COUNT(*) сохраняется оценка планировщика, и номер страницы сверху
+    не ограничивается.
+    """
+
+    def __init__(self, object_list, per_page, scopes=(), **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scopes = scopes
+        self.estimated = False
+
+    def get_count_key(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        versions = get_versions(
+            [COUNT_VERSION_KEY.format(scope) for scope in self.scopes])
+        digest = hashlib.sha256(repr((
+            sql, params, queryset.db, sorted(versions.items()),
+        )).encode()).hexdigest()
+        return COUNT_KEY.format(digest)
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        queryset = count_queryset(self.object_list)
+        key = self.get_count_key(queryset)
+        cached = cache.get(key)
+        if cached is None:
+            estimate = estimate_count(queryset)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                cached = (estimate, True)
+            else:
+                cached = (queryset.count(), False)
+            cache.set(key, cached, COUNT_TTL)
+        count, self.estimated = cached
+        return count
+
+    def validate_number(self, number):
+        if not self.count or not self.estimated:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.estimated:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self)
@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from foodgram.metrics import DB_POOL_ACQUIRES
+
+Database = base.Database
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений psycopg2 одного процесса.
+
+    Соединение берётся на время запроса и возвращается при его
+    завершении; перед возвратом состояние сессии сбрасывается, а перед
+    повторной выдачей долго простаивавшее соединение проверяется.
+    """
+
+    def __init__(self, name, max_size=10, timeout=5, max_idle=300,
+                 check_after=1):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.size = 0
+        self.stats = dict.fromkeys(
+            ('connects', 'reuses', 'failed_checks', 'discards', 'waits',
+             'timeouts'), 0)
+
+    def acquire(self, connect):
+        deadline = time.monotonic() + self.timeout
+        connection = None
+        with self.condition:
+            while True:
+                self.close_expired()
+                if self.idle:
+                    connection, released_at = self.idle.pop()
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise Database.OperationalError(
+                        'Нет свободных соединений в пуле.')
+                self.stats['waits'] += 1
+                self.condition.wait(remaining)
+        if connection is not None:
+            if (time.monotonic() - released_at < self.check_after
+                    or self.is_usable(connection)):
+                self.record('reuses')
+                DB_POOL_ACQUIRES.labels(self.name, 'reused').inc()
+                return connection
+            self.record('failed_checks')
+            self.close_quietly(connection)
+        try:
+            connection = connect()
+        except Exception:
+            self.forget()
+            raise
+        self.record('connects')
+        DB_POOL_ACQUIRES.labels(self.name, 'new').inc()
+        return connection
+
+    def release(self, connection):
+        if not self.reset(connection):
+            return self.discard(connection)
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def discard(self, connection):
+        self.close_quietly(connection)
+        self.forget('discards')
+
+    def forget(self, counter=None):
+        with self.condition:
+            if counter:
+                self.stats[counter] += 1
+            self.size -= 1
+            self.condition.notify()
+
+    def record(self, counter):
+        with self.condition:
+            self.stats[counter] += 1
+
+    def close_expired(self):
+        """Закрывает соединения, простаивающие дольше max_idle."""
+        expired_at = time.monotonic() - self.max_idle
+        while self.idle and self.idle[0][1] < expired_at:
+            self.close_quietly(self.idle.popleft()[0])
+            self.size -= 1
+
+    def is_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Database.Error:
+            return False
+        return True
+
+    def reset(self, connection):
+        """Откат незавершённой транзакции и сброс состояния сессии."""
+        if connection.closed:
+            return False
+        try:
+            if (connection.get_transaction_status()
+                    != extensions.TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute('DISCARD ALL')
+        except Database.Error:
+            return False
+        return True
+
+    def close_quietly(self, connection):
+        try:
+            connection.close()
+        except Database.Error:
+            pass
+
+    def get_stats(self):
+        with self.condition:
+            stats = dict(self.stats, size=self.size, idle=len(self.idle))
+        acquired = stats['connects'] + stats['reuses']
+        stats['reuse_ratio'] = stats['reuses'] / acquired if acquired else 0
+        return stats
+
+
+def pool_stats():
+    """Счётчики пулов процесса по псевдонимам БД."""
+    with pools_lock:
+        return {alias: pool.get_stats() for alias, pool in pools.items()}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Бэкенд PostgreSQL, который берёт соединения из пула процесса.
+
+    Параметры пула задаются ключом POOL в настройках БД; CONN_MAX_AGE
+    должен быть 0, чтобы соединение возвращалось в пул после запроса.
+    """
+
+    def get_pool(self):
+        with pools_lock:
+            pool = pools.get(self.alias)
+            if pool is None:
+                pool = pools[self.alias] = ConnectionPool(
+                    self.alias, **self.settings_dict.get('POOL', {}))
+            return pool
+
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool().acquire(
+            partial(super().get_new_connection, conn_params))
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django сохраняет ссылку на соединение до конца
+                # транзакции, поэтому вернуть его в пул нельзя.
+                self.get_pool().discard(self.connection)
+            else:
+                self.get_pool().release(self.connection)
@@ -0,0 +1,212 @@
+import cProfile
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+SAMPLE_INTERVAL = 0.005
+CAPTURE_NAME = re.compile(r'^[\w.-]+\.(prof|collapsed)$')
+
+# Профилируемый асинхронный запрос: профилировщик запускается в потоке
+# пула, где выполняется синхронная часть запроса (см. profile_in_thread).
+current_capture = ContextVar('profiling_capture', default=None)
+
+
+class StackSampler:
+    """Сэмплирующий профилировщик одного потока.
+
+    Раз в SAMPLE_INTERVAL секунд снимает стек потока; результат —
+    свёрнутые стеки «f1;f2;f3 N» для flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} '
+                             f'({os.path.basename(code.co_filename)}'
+                             f':{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def dump(self, path):
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+
+class CProfiler:
+    def __init__(self, thread_id):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def dump(self, path):
+        self.profile.dump_stats(path)
+
+
+PROFILERS = {
+    'cprofile': (CProfiler, 'prof'),
+    'sampling': (StackSampler, 'collapsed'),
+}
+
+
+class Capture:
+    def __init__(self, profiler_class):
+        self.profiler_class = profiler_class
+        self.profiler = None
+
+
+@contextmanager
+def profile_in_thread():
+    """Профилирование синхронного кода асинхронного запроса.
+
+    Снимается первый вызов в потоке пула; без профилируемого запроса
+    ничего не делает.
+    """
+    capture = current_capture.get()
+    if capture is None or capture.profiler is not None:
+        yield
+        return
+    profiler = capture.profiler_class(threading.get_ident())
+    capture.profiler = profiler
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+
+
+def view_tag(request):
+    """Вьюсет и действие запроса для имени файла профиля."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = getattr(match.func, 'cls', match.func)
+    action = (getattr(match.func, 'actions', None) or {}).get(
+        request.method.lower(), request.method.lower())
+    return re.sub(r'[^\w-]', '_', f'{view.__name__}-{action}')
+
+
+def list_captures():
+    """Снимки профилей, новые первыми: [(имя, размер, время изменения)]."""
+    try:
+        entries = list(os.scandir(settings.PROFILING_DIR))
+    except FileNotFoundError:
+        return []
+    captures = [(entry.name, entry.stat().st_size, entry.stat().st_mtime)
+                for entry in entries if CAPTURE_NAME.match(entry.name)]
+    return sorted(captures, key=lambda capture: capture[2], reverse=True)
+
+
+def capture_path(name):
+    """Путь к снимку или None для чужих и несуществующих имён."""
+    if not CAPTURE_NAME.match(name):
+        return None
+    path = os.path.join(settings.PROFILING_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def remove_old_captures():
+    for name, _, _ in list_captures()[settings.PROFILING_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(settings.PROFILING_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+class ProfilingMiddleware:
+    """Профилирование отдельных запросов по заголовку или выборке.
+
+    Профилируется запрос с заголовком X-Profile, равным PROFILING_TOKEN,
+    и доля PROFILING_SAMPLE_RATE остальных. Имя снимка возвращается
+    в заголовке X-Profile-Capture. В режиме ASGI профилируется работа
+    запроса в пуле потоков. При PROFILING=False промежуточный слой
+    отключается целиком.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        self.get_response = get_response
+        self.profiler_class, self.extension = PROFILERS[
+            settings.PROFILING_MODE]
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def should_profile(self, request):
+        token = request.META.get(PROFILE_HEADER)
+        if token and settings.PROFILING_TOKEN:
+            return hmac.compare_digest(token, settings.PROFILING_TOKEN)
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.should_profile(request):
+            return self.get_response(request)
+        profiler = self.profiler_class(threading.get_ident())
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        self.save(request, response, profiler, started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.should_profile(request):
+            return await self.get_response(request)
+        capture = Capture(self.profiler_class)
+        token = current_capture.set(capture)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_capture.reset(token)
+        if capture.profiler is not None:
+            self.save(request, response, capture.profiler, started)
+        return response
+
+    def save(self, request, response, profiler, started):
+        elapsed = (time.perf_counter() - started) * 1000
+        name = (f'{datetime.now():%Y%m%d-%H%M%S-%f}-{view_tag(request)}-'
+                f'{elapsed:.0f}ms.{self.extension}')
+        profiler.dump(os.path.join(settings.PROFILING_DIR, name))
+        remove_old_captures()
+        response['X-Profile-Capture'] = name
@@ -0,0 +1,204 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from foodgram.utils import client_key
+
+STICKY_KEY = 'replica-sticky:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Токен и сессия должны быть видны сразу после входа, когда у клиента
+# ещё нет метки «писал недавно».
+PRIMARY_ONLY_MODELS = {'authtoken.token', 'sessions.session'}
+
+PG_LAG_SQL = (
+    'SELECT CASE '
+    'WHEN NOT pg_is_in_recovery() THEN 0 '
+    'WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) '
+    'END'
+)
+
+
+class RequestState:
+    """Маршрутизация в рамках одного запроса."""
+
+    def __init__(self, replica_reads, sticky=False):
+        self.replica_reads = replica_reads
+        self.sticky = sticky
+        self.replica = None
+        self.wrote = False
+        # Пакет запросов: метка «писал недавно» ставится, только если
+        # подзапросы что-то записали.
+        self.subrequests = False
+
+
+request_state = ContextVar('replica_request_state', default=None)
+
+
+@contextmanager
+def subrequest_routing(method):
+    """Маршрутизация подзапроса пакета.
+
+    Безопасный подзапрос читает с реплик, если клиент не писал недавно
+    и пакет ещё ничего не записал; запись подзапроса отмечается в
+    состоянии пакета. Потоки пула не наследуют контекст, поэтому
+    параллельные подзапросы запускаются в его копии
+    (contextvars.copy_context).
+    """
+    parent = request_state.get()
+    if parent is None:
+        yield
+        return
+    parent.subrequests = True
+    state = RequestState(
+        method in SAFE_METHODS and not (parent.sticky or parent.wrote),
+        parent.sticky)
+    token = request_state.set(state)
+    try:
+        yield
+    finally:
+        request_state.reset(token)
+        if state.wrote:
+            parent.wrote = True
+
+
+class ReplicaPool:
+    """Реплики, прошедшие последнюю проверку доступности и отставания.
+
+    Проверка выполняется не чаще раза в REPLICA_CHECK_INTERVAL секунд
+    одним потоком; остальные потоки используют прошлый результат.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = None
+        self.healthy = []
+
+    def lag(self, alias):
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor != 'postgresql':
+                cursor.execute('SELECT 1')
+                return 0
+            cursor.execute(PG_LAG_SQL)
+            return float(cursor.fetchone()[0] or 0)
+
+    def is_healthy(self, alias):
+        try:
+            return self.lag(alias) <= settings.REPLICA_MAX_LAG
+        except DatabaseError:
+            connections[alias].close()
+            return False
+
+    def available(self):
+        now = time.monotonic()
+        if (self.checked_at is not None
+                and now - self.checked_at < settings.REPLICA_CHECK_INTERVAL):
+            return self.healthy
+        if self.lock.acquire(blocking=False):
+            try:
+                self.healthy = [alias for alias in settings.DATABASE_REPLICAS
+                                if self.is_healthy(alias)]
+                self.checked_at = time.monotonic()
+            finally:
+                self.lock.release()
+        return self.healthy
+
+
+replica_pool = ReplicaPool()
+
+
+class PrimaryReplicaRouter:
+    """Чтение безопасных запросов API с реплик, запись — в основную БД.
+
+    Реплики используются только внутри запроса, размеченного
+    ReplicaRoutingMiddleware; команды, миграции и фоновые задачи
+    работают с основной БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = request_state.get()
+        if (state is None or not state.replica_reads or state.wrote
+                or model._meta.label_lower in PRIMARY_ONLY_MODELS):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if state.replica is None:
+            replicas = replica_pool.available()
+            state.replica = (random.choice(replicas) if replicas
+                             else DEFAULT_DB_ALIAS)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """Разметка запросов для PrimaryReplicaRouter.
+
+    После записи клиент REPLICA_STICKY_SECONDS секунд читает из основной
+    БД, чтобы видеть свои изменения, пока реплики их догоняют. Метка
+    хранится в общем кэше (Redis): следующий запрос клиента может попасть
+    в другой воркер.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        if not settings.SHARED_CACHE:
+            raise ImproperlyConfigured(
+                'Для чтения с реплик нужен общий кэш: задайте REDIS_URL.')
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def start(self, request):
+        key = client_key(request)
+        sticky = bool(key and cache.get(STICKY_KEY.format(key)))
+        state = RequestState(
+            request.method in SAFE_METHODS and not sticky, sticky)
+        return key, state, request_state.set(state)
+
+    def finish(self, request, key, state):
+        unsafe = (request.method not in SAFE_METHODS
+                  and not state.subrequests)
+        if key and (state.wrote or unsafe):
+            cache.set(STICKY_KEY.format(key), True,
+                      settings.REPLICA_STICKY_SECONDS)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key, state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_state.reset(token)
+        self.finish(request, key, state)
+        return response
+
+    async def __acall__(self, request):
+        key, state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_state.reset(token)
+        self.finish(request, key, state)
+        return response
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -32,7 +33,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.profiling.ProfilingMiddleware',
+    'foodgram.replicas.ReplicaRoutingMiddleware',
+    'foodgram.admission.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -61,14 +66,59 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+# Асинхронный режим для чтения рецептов, поиска ингредиентов,
+# коротких ссылок и избранного/корзины (запуск под ASGI-сервером).
+ASYNC_API = os.getenv('ASYNC_API', 'False').lower() == 'true'
+
+ASYNC_API_THREADS = int(os.getenv('ASYNC_API_THREADS', 32))
+
+# Потоки для входа и регистрации под ASGI: хеширование пароля
+# занимает ядро целиком, по умолчанию потоков столько же, сколько ядер.
+AUTH_HASH_THREADS = int(os.getenv('AUTH_HASH_THREADS', os.cpu_count()))
+
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+
+# Потоки для одновременных GET-подзапросов /api/batch/.
+BATCH_THREADS = int(os.getenv('BATCH_THREADS', 4))
+
+# Общий для воркеров кэш. Без REDIS_URL кэш хранится в памяти процесса:
+# этого хватает одному процессу, но сброс кэша не доходит до других
+# воркеров, поэтому gunicorn с несколькими воркерами требует Redis.
+REDIS_URL = os.getenv('REDIS_URL', '')
+
+SHARED_CACHE = bool(REDIS_URL)
+
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+DB_POOL = os.getenv('DB_POOL', 'False').lower() == 'true'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': ('foodgram.postgresql_pool' if DB_POOL
+                   else 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # С пулом соединение возвращается в него после каждого запроса,
+        # без пула — остаётся открытым CONN_MAX_AGE секунд.
+        'CONN_MAX_AGE': 0 if DB_POOL else int(
+            os.getenv('DB_CONN_MAX_AGE', 60)),
+        'POOL': {
+            'max_size': int(os.getenv('DB_POOL_SIZE', 10)),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            'check_after': float(os.getenv('DB_POOL_CHECK_AFTER', 1)),
+        },
     }
 }
 
@@ -76,9 +126,57 @@ DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
 #         'NAME': BASE_DIR / 'db.sqlite3',
-#     }
+#     },
+#     'replica_1': {
+#         'ENGINE': 'django.db.backends.sqlite3',
+#         'NAME': BASE_DIR / 'replica.sqlite3',
+#         'TEST': {'MIRROR': 'default'},
+#     },
 # }
 
+for number, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['foodgram.replicas.PrimaryReplicaRouter']
+
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 5))
+
+REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+
+# Алгоритм новых хешей паролей: scrypt, argon2 (нужен argon2-cffi) или
+# pbkdf2. Хеши остальных алгоритмов проверяются и при входе
+# пересчитываются выбранным, как и хеши с прежними параметрами.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'scrypt')
+
+PASSWORD_HASHER_CLASSES = {
+    'scrypt': 'users.hashers.ScryptPasswordHasher',
+    'argon2': 'users.hashers.Argon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CLASSES.items()
+    if name != PASSWORD_HASHER]
+
+# n = 2 ** 14: 16 МБ памяти на хеш.
+SCRYPT_WORK_FACTOR = int(os.getenv('SCRYPT_WORK_FACTOR', 2 ** 14))
+
+# Память в КиБ; по умолчанию 19 МиБ, 2 прохода, 1 поток.
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 19456))
+
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 1))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -114,9 +212,86 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Гистограммы запросов и /metrics включаются явно.
+METRICS = os.getenv('METRICS', 'False').lower() == 'true'
+
+# /metrics требует заголовок Authorization: Bearer <токен>; без токена
+# адрес отвечает 404.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Кэширование анонимных ответов чтения API в nginx
+# (infra/nginx.microcache.conf).
+EDGE_CACHE = os.getenv('EDGE_CACHE', 'False').lower() == 'true'
+
+EDGE_CACHE_TTL = int(os.getenv('EDGE_CACHE_TTL', 10))
+
+EDGE_CACHE_STALE = int(os.getenv('EDGE_CACHE_STALE', 60))
+
+# Внутренний адрес nginx, на котором запрос обновляет запись кэша.
+EDGE_CACHE_PURGE_URL = os.getenv('EDGE_CACHE_PURGE_URL', '')
+
+# Значения заголовка Host, под которыми клиенты обращаются к сайту.
+EDGE_CACHE_HOSTS = os.getenv(
+    'EDGE_CACHE_HOSTS', ','.join(ALLOWED_HOSTS)).split(',')
+
+PROFILING = os.getenv('PROFILING', 'False').lower() == 'true'
+
+# Запрос с заголовком X-Profile: <PROFILING_TOKEN> профилируется всегда.
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+
+# cprofile — файлы .prof, sampling — свёрнутые стеки для flamegraph.
+PROFILING_MODE = os.getenv('PROFILING_MODE', 'cprofile')
+
+PROFILING_DIR = os.getenv('PROFILING_DIR', BASE_DIR / 'profiles')
+
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', 200))
+
+# Включается явно: при одном воркере и в разработке лимиты не нужны.
+ADMISSION_CONTROL = os.getenv(
+    'ADMISSION_CONTROL', 'False').lower() == 'true'
+
+# Каталог должен быть общим для всех воркеров одного хоста.
+ADMISSION_LOCK_DIR = os.getenv(
+    'ADMISSION_LOCK_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram-admission'))
+
+ADMISSION_CLASSES = {
+    'heavy': {
+        # (путь класса вьюсета, действие).
+        'actions': (
+            ('api.views.RecipeViewSet', 'download_shopping_cart'),
+            ('api.views.RecipeViewSet', 'create'),
+            ('api.views.RecipeViewSet', 'update'),
+            ('api.views.RecipeViewSet', 'partial_update'),
+            ('api.views.RecipeViewSet', 'favorite_bulk'),
+            ('api.views.RecipeViewSet', 'shopping_cart_bulk'),
+            ('api.views.UserViewSet', 'subscriptions'),
+        ),
+        'limit': int(os.getenv('ADMISSION_HEAVY_LIMIT', 4)),
+        'queue_timeout': float(os.getenv('ADMISSION_HEAVY_QUEUE_TIMEOUT', 2)),
+        'retry_after': 5,
+    },
+}
+
+# exists — подзапросы EXISTS для каждого рецепта, sets — множества id
+# избранного и корзины пользователя из кэша (см. bench_user_flags).
+USER_FLAGS_ENGINE = os.getenv('USER_FLAGS_ENGINE', 'exists')
+
+# Списки и карточки рецептов собираются из готовых документов
+# (recipes.RecipeDocument), а не сериализуются заново. Включать после
+# rebuild_recipe_documents: строки из bulk_create и SQL документов
+# не получают.
+RECIPE_DOCUMENTS = os.getenv(
+    'RECIPE_DOCUMENTS', 'False').lower() == 'true'
+
+SIMILARITY_MATRIX_PATH = os.getenv(
+    'SIMILARITY_MATRIX_PATH', BASE_DIR / 'similarity.npz')
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -4,13 +4,22 @@ from django.contrib import admin
 from django.urls import include, path, re_path
 
 from api import services
+from .metrics import metrics
+
+if settings.ASYNC_API:
+    from api.async_views import redirection
+else:
+    redirection = services.redirection
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    re_path(r'^(?P<short_url>[a-f0-9]{10})/$', services.redirection),
+    re_path(r'^(?P<short_url>[a-f0-9]{10})/$', redirection),
 ]
 
+if settings.METRICS:
+    urlpatterns.append(path('metrics', metrics))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL,
                           document_root=settings.MEDIA_ROOT)
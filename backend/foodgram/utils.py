@@ -0,0 +1,12 @@
+import hashlib
+
+from django.conf import settings
+
+
+def client_key(request):
+    """Хеш учётных данных клиента (токен или сессия) или None."""
+    credentials = (request.META.get('HTTP_AUTHORIZATION')
+                   or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if credentials:
+        return hashlib.sha256(credentials.encode()).hexdigest()
+    return None
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+
+from api.serializers import (FollowSerializer, IngredientSerializer,
+                             RecipeSerializer, ShortRecipeSerializer,
+                             TagSerializer, UserSerializer)
+from recipes.ingredient_index import ingredient_index
+from recipes.similarity import load_matrix
+from recipes.tags import get_tag_map
+
+SERIALIZERS = (RecipeSerializer, ShortRecipeSerializer, FollowSerializer,
+               UserSerializer, IngredientSerializer, TagSerializer)
+
+
+def compile_patterns(patterns):
+    for pattern in patterns:
+        pattern.pattern.regex
+        if hasattr(pattern, 'url_patterns'):
+            compile_patterns(pattern.url_patterns)
+
+
+def warm_up(connect=None):
+    """Подготовка нового воркера до первого запроса.
+
+    Компилирует маршруты, строит поля сериализаторов и заполняет кэши
+    тегов, индекса ингредиентов и матрицы похожести. Соединения с БД
+    открываются, только если ими воспользуются запросы (connect): с
+    пулом они возвращаются в него, без пула соединения Django
+    привязаны к потоку, и открытое в главном потоке пригодится лишь
+    воркеру sync, обслуживающему запросы в этом же потоке. По умолчанию
+    соединения открываются только с пулом.
+    """
+    if connect is None:
+        connect = settings.DB_POOL
+    if connect:
+        for connection in connections.all():
+            try:
+                connection.ensure_connection()
+            except DatabaseError:
+                # Недоступная реплика не должна мешать запуску воркера.
+                pass
+    resolver = get_resolver()
+    compile_patterns(resolver.url_patterns)
+    resolver.reverse_dict
+    for serializer_class in SERIALIZERS:
+        serializer_class().fields
+    get_tag_map()
+    with ingredient_index.lock:
+        ingredient_index.refresh()
+    load_matrix()
+    if settings.DB_POOL or not connect:
+        # С пулом соединения возвращаются в него и достаются потокам
+        # запросов; без пула соединение главного потока, открытое для
+        # кэшей, запросам не нужно.
+        connections.close_all()
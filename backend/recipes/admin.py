@@ -1,43 +1,79 @@
 from django.contrib import admin
 from django.contrib.admin import display
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
+from foodgram.paginators import EstimatedCountPaginator
 from .models import FavoriteRecipe, Ingredient, Recipe, ShoppingCart, Tag
 
 
 class IngridientsInline(admin.TabularInline):
     model = Recipe.ingredients.through
     min_num = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient')
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug')
+    search_fields = ('name',)
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
     search_fields = ('name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('name', 'author', 'count_favorites', 'get_ingredients')
-    list_filter = ('author', 'name', 'tags')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
     search_fields = ('name', 'author__username', 'tags__name')
     readonly_fields = ('count_favorites',)
+    autocomplete_fields = ('author',)
     inlines = [IngridientsInline]
     exclude = ('ingredients',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Подзапрос считается только для строк страницы, в отличие от
+        # Count('favorites') с GROUP BY по всей выборке.
+        favorites = FavoriteRecipe.objects.filter(
+            recipe=OuterRef('pk')).order_by().values('recipe').annotate(
+            count=Count('pk')).values('count')
+        return super().get_queryset(request).annotate(
+            favorites_count=Coalesce(
+                Subquery(favorites, output_field=IntegerField()), 0)
+        ).prefetch_related('ingredients')
 
-    @display(description='Количество в избранном')
+    @display(description='Количество в избранном',
+             ordering='favorites_count')
     def count_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     @display(description='Ингредиенты')
     def get_ingredients(self, obj):
         return ", ".join(ing.name for ing in obj.ingredients.all())
 
 
-admin.site.register(ShoppingCart)
-admin.site.register(FavoriteRecipe)
+class UserRecipeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+admin.site.register(ShoppingCart, UserRecipeAdmin)
+admin.site.register(FavoriteRecipe, UserRecipeAdmin)
@@ -4,3 +4,26 @@ MAX_LEN_UNIT = 64
 MAX_LEN_TAG = 32
 MAX_LEN_RECIPE = 256
 MIN_VALUE = 1
+MAX_BULK_RECIPES = 100
+FEED_FANOUT_LIMIT = 10000
+FEED_BACKFILL_LIMIT = 1000
+FEED_BACKFILL_BATCH = 100000
+FEED_FANOUT_AUTHORS_TTL = 300
+SIMILAR_TOP_K = 10
+SIMILAR_TAG_WEIGHT = 0.5
+INGREDIENT_INDEX_TTL = 3600
+INGREDIENT_INDEX_MAX_LAG = 1000
+COOKABLE_MAX_RESULTS = 1000
+COOKABLE_MAX_MISSING = 3
+COOKABLE_MAX_INGREDIENTS = 100
+POPULAR_HALF_LIFE_DAYS = 30
+TRENDING_HALF_LIFE_DAYS = 1
+FAVORITE_SCORE_WEIGHT = 1.0
+CART_SCORE_WEIGHT = 0.5
+SCORE_OVERLAP_SECONDS = 600
+SCORE_FULL_RECOMPUTE_HOURS = 24
+SCORE_BATCH = 1000
+USER_RECIPES_TTL = 3600
+TAG_MAP_TTL = 300
+USER_FLAGS_MAX_IN = 1000
+RECIPE_DOCUMENTS_BATCH = 500
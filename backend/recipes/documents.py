@@ -0,0 +1,113 @@
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+
+from .constants import RECIPE_DOCUMENTS_BATCH
+from .models import Recipe, RecipeDocument
+
+PENDING_ATTR = 'recipe_documents_pending'
+
+
+def image_url(image):
+    return image.url if image else None
+
+
+def build_document(recipe):
+    """Поля ответа RecipeSerializer, не зависящие от пользователя."""
+    author = recipe.author
+    return {
+        'id': recipe.pk,
+        'tags': [
+            {'id': tag.pk, 'name': tag.name, 'slug': tag.slug}
+            for tag in recipe.tags.all()
+        ],
+        'author': {
+            'email': author.email,
+            'id': author.pk,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'avatar': image_url(author.avatar),
+        },
+        'ingredients': [
+            {'id': item.ingredient_id,
+             'name': item.ingredient.name,
+             'measurement_unit': item.ingredient.measurement_unit,
+             'amount': item.amount}
+            for item in recipe.recipeingredient_set.all()
+        ],
+        'name': recipe.name,
+        'image': image_url(recipe.image),
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+def document_queryset():
+    return Recipe.objects.select_related('author').prefetch_related(
+        'tags', 'recipeingredient_set__ingredient')
+
+
+def load_missing_documents(recipes):
+    """Поля для рецептов, документ которых ещё не собран.
+
+    Такие рецепты сериализуются как обычно, поэтому описание и связи
+    догружаются для всех сразу, а не отдельными запросами на рецепт.
+    """
+    missing = [recipe for recipe in recipes
+               if getattr(recipe, 'document', None) is None]
+    if not missing:
+        return
+    texts = dict(Recipe.objects.filter(
+        pk__in=[recipe.pk for recipe in missing]).values_list('pk', 'text'))
+    for recipe in missing:
+        recipe.text = texts.get(recipe.pk, '')
+    prefetch_related_objects(
+        missing, 'author', 'tags', 'recipeingredient_set__ingredient')
+
+
+def refresh_documents(recipe_ids):
+    """Пересборка документов рецептов пачками.
+
+    Строки рецептов блокируются до чтения, поэтому параллельные
+    пересборки одного рецепта выполняются по очереди и последней
+    записывается актуальная версия.
+    """
+    recipe_ids = sorted(set(recipe_ids))
+    for start in range(0, len(recipe_ids), RECIPE_DOCUMENTS_BATCH):
+        batch = recipe_ids[start:start + RECIPE_DOCUMENTS_BATCH]
+        with transaction.atomic():
+            list(Recipe.objects.select_for_update().filter(
+                pk__in=batch).order_by('pk').values_list('pk', flat=True))
+            documents = [
+                RecipeDocument(recipe_id=recipe.pk,
+                               data=build_document(recipe))
+                for recipe in document_queryset().filter(pk__in=batch)
+            ]
+            RecipeDocument.objects.filter(recipe_id__in=batch).delete()
+            RecipeDocument.objects.bulk_create(documents)
+
+
+def flush_documents():
+    """Пересборка документов, отмеченных в текущей транзакции."""
+    connection = transaction.get_connection()
+    pending = connection.__dict__.pop(PENDING_ATTR, None)
+    if pending:
+        refresh_documents(pending)
+
+
+def documents_changed(recipe_ids):
+    """Отметка рецептов, документы которых нужно пересобрать.
+
+    Вне транзакции документы пересобираются сразу. В транзакции id
+    копятся и пересобираются одним проходом: до фиксации, если
+    вызван flush_documents(), иначе сразу после неё.
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        refresh_documents(recipe_ids)
+        return
+    connection.__dict__.setdefault(PENDING_ATTR, set()).update(recipe_ids)
+    transaction.on_commit(flush_documents)
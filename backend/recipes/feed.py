@@ -0,0 +1,139 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from foodgram.background import BackgroundQueue
+from users.models import Follow
+from .constants import (FEED_BACKFILL_BATCH, FEED_BACKFILL_LIMIT,
+                        FEED_FANOUT_AUTHORS_TTL, FEED_FANOUT_LIMIT)
+from .models import FeedItem, Recipe
+
+FANOUT_AUTHORS_KEY = 'feed:fanout-on-read-authors'
+
+
+def get_fanout_on_read_authors():
+    """Авторы с большим числом подписчиков, рецепты которых не
+    раскладываются по лентам, а подмешиваются при чтении.
+
+    Множество хранится в общем кэше (Redis) и одинаково во всех
+    воркерах; при переходе автора через FEED_FANOUT_LIMIT ключ
+    сбрасывается.
+    """
+    authors = cache.get(FANOUT_AUTHORS_KEY)
+    if authors is None:
+        authors = set(Follow.objects.values('author').annotate(
+            followers=Count('id')
+        ).filter(
+            followers__gt=FEED_FANOUT_LIMIT
+        ).values_list('author', flat=True))
+        cache.set(FANOUT_AUTHORS_KEY, authors, FEED_FANOUT_AUTHORS_TTL)
+    return authors
+
+
+def fan_out_recipe(recipe):
+    """Раскладка нового рецепта по лентам подписчиков автора."""
+    followers = list(Follow.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True)[:FEED_FANOUT_LIMIT + 1])
+    if len(followers) > FEED_FANOUT_LIMIT:
+        cache.delete(FANOUT_AUTHORS_KEY)
+        return
+    FeedItem.objects.bulk_create(
+        [FeedItem(user_id=user_id, recipe_id=recipe.pk,
+                  author_id=recipe.author_id, pub_date=recipe.pub_date)
+         for user_id in followers],
+        batch_size=1000, ignore_conflicts=True)
+
+
+def latest_recipes(author_id):
+    return list(Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-pub_date').values_list(
+        'pk', 'pub_date')[:FEED_BACKFILL_LIMIT])
+
+
+def fill_feeds(user_ids, author_id, recipes):
+    FeedItem.objects.bulk_create(
+        [FeedItem(user_id=user_id, recipe_id=recipe_id,
+                  author_id=author_id, pub_date=pub_date)
+         for user_id in user_ids
+         for recipe_id, pub_date in recipes],
+        batch_size=1000, ignore_conflicts=True)
+
+
+def backfill_feed(user_id, author_id):
+    """Заполнение ленты последними рецептами нового автора."""
+    if author_id in get_fanout_on_read_authors():
+        return
+    fill_feeds([user_id], author_id, latest_recipes(author_id))
+
+
+def backfill_followers(author_id):
+    """Раскладка рецептов автора, вышедшего из fan-out on read.
+
+    Пока автор был в этом множестве, его рецепты в ленты не попадали;
+    без дозаполнения они пропали бы из лент подписчиков.
+    """
+    recipes = latest_recipes(author_id)
+    followers = list(Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True))
+    batch = max(1, FEED_BACKFILL_BATCH // max(1, len(recipes)))
+    for start in range(0, len(followers), batch):
+        fill_feeds(followers[start:start + batch], author_id, recipes)
+    # Ключ сбрасывается после дозаполнения: до этого лента ещё
+    # подмешивает рецепты автора при чтении.
+    cache.delete(FANOUT_AUTHORS_KEY)
+
+
+def backfill_authors(author_ids):
+    for author_id in author_ids:
+        backfill_followers(author_id)
+
+
+followers_backfills = BackgroundQueue('feed-backfill', backfill_authors)
+
+
+def trim_feed(user_id, author_id):
+    """Удаление из ленты рецептов автора после отписки.
+
+    Если подписчиков стало ровно FEED_FANOUT_LIMIT, автор только что
+    вышел из fan-out on read: ленты остальных подписчиков дозаполняются
+    в фоновом потоке после фиксации, запрос отписки этого не ждёт.
+    """
+    FeedItem.objects.filter(user_id=user_id, author_id=author_id).delete()
+    if Follow.objects.filter(
+            author_id=author_id).count() == FEED_FANOUT_LIMIT:
+        transaction.on_commit(lambda: followers_backfills.put(author_id))
+
+
+def keyset(queryset, cursor, pk_field):
+    pub_date, pk = cursor
+    return queryset.filter(pub_date__lte=pub_date).exclude(
+        pub_date=pub_date, **{f'{pk_field}__gte': pk})
+
+
+def get_feed_page(user, limit, cursor=None):
+    """Страница ленты: список (pub_date, id рецепта) по убыванию.
+
+    Лента читается одним диапазонным проходом по индексу
+    (user, -pub_date, -recipe); рецепты авторов с огромным числом
+    подписчиков подмешиваются из таблицы рецептов (fan-out on read).
+    """
+    items = FeedItem.objects.filter(user=user)
+    if cursor:
+        items = keyset(items, cursor, 'recipe_id')
+    page = list(items.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit])
+    fanout_authors = get_fanout_on_read_authors()
+    big_authors = fanout_authors and list(Follow.objects.filter(
+        user=user, author__in=fanout_authors
+    ).values_list('author_id', flat=True))
+    if big_authors:
+        recipes = Recipe.objects.filter(author__in=big_authors)
+        if cursor:
+            recipes = keyset(recipes, cursor, 'pk')
+        page = sorted(
+            set(page) | set(recipes.order_by('-pub_date', '-pk').values_list(
+                'pub_date', 'pk')[:limit]),
+            reverse=True)[:limit]
+    return page
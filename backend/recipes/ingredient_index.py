@@ -0,0 +1,200 @@
+import threading
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from .constants import INGREDIENT_INDEX_MAX_LAG, INGREDIENT_INDEX_TTL
+from .models import Recipe, RecipeIngredient
+
+VERSION_KEY = 'ingredient-index:version'
+CHANGE_KEY = 'ingredient-index:change:{}'
+PENDING_ATTR = 'ingredient_index_pending'
+
+
+def current_version():
+    """Версия изменений в общем кэше.
+
+    Ключ хранится без срока и не вытесняется (volatile-lru). Если он
+    всё же пропал, отсчёт начинается с нового случайного значения, а не
+    с нуля: процессы со старой версией увидят скачок и перестроят
+    индекс, а не примут новую версию за уже применённую.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY, 0)
+    return version
+
+
+class IngredientIndex:
+    """Инвертированный индекс «ингредиент → рецепты» в памяти процесса.
+
+    Рецепту соответствует слот; для каждого ингредиента хранится
+    отсортированный массив слотов (int32). Изменения рецептов
+    записываются в общий кэш (Redis) под возрастающей версией, поэтому
+    другие процессы догоняют индекс точечно, не перестраивая его
+    целиком.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built_at = None
+        self.version = 0
+
+    def build(self):
+        version = current_version()
+        pairs = np.array(
+            list(RecipeIngredient.objects.order_by().values_list(
+                'recipe_id', 'ingredient_id')),
+            dtype=np.int64).reshape(-1, 2)
+        recipes = list(Recipe.objects.order_by('pk').values_list(
+            'pk', 'pub_date'))
+        recipe_ids = np.array([pk for pk, _ in recipes], dtype=np.int64)
+        self.pub_dates = np.array(
+            [pub_date.timestamp() for _, pub_date in recipes],
+            dtype=np.float64)
+        slots = np.searchsorted(recipe_ids, pairs[:, 0])
+        order = np.lexsort((slots, pairs[:, 1]))
+        ingredients, starts = np.unique(pairs[order, 1], return_index=True)
+        self.postings = dict(zip(
+            ingredients.tolist(),
+            np.split(slots[order].astype(np.int32), starts[1:])))
+        self.recipe_ids = recipe_ids
+        self.slots = {pk: slot for slot, pk in enumerate(recipe_ids.tolist())}
+        self.sizes = np.bincount(slots, minlength=len(recipe_ids))
+        self.recipe_ingredients = {}
+        for slot, ingredient_id in zip(slots.tolist(), pairs[:, 1].tolist()):
+            self.recipe_ingredients.setdefault(slot, []).append(
+                ingredient_id)
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def remove_slot(self, slot):
+        for ingredient_id in self.recipe_ingredients.pop(slot, ()):
+            posting = self.postings[ingredient_id]
+            self.postings[ingredient_id] = posting[posting != slot]
+        self.sizes[slot] = 0
+
+    def add_slot(self, recipe_id, pub_date):
+        slot = len(self.recipe_ids)
+        self.recipe_ids = np.append(self.recipe_ids, recipe_id)
+        self.pub_dates = np.append(self.pub_dates, pub_date.timestamp())
+        self.sizes = np.append(self.sizes, 0)
+        self.slots[recipe_id] = slot
+        return slot
+
+    def apply(self, recipe_ids):
+        """Точечное обновление индекса для изменённых рецептов."""
+        current = {}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            current.setdefault(recipe_id, []).append(ingredient_id)
+        pub_dates = dict(Recipe.objects.filter(
+            pk__in=current).values_list('pk', 'pub_date'))
+        for recipe_id in recipe_ids:
+            slot = self.slots.get(recipe_id)
+            if slot is not None:
+                self.remove_slot(slot)
+            if recipe_id not in current or recipe_id not in pub_dates:
+                continue
+            if slot is None:
+                slot = self.add_slot(recipe_id, pub_dates[recipe_id])
+            self.recipe_ingredients[slot] = current[recipe_id]
+            self.sizes[slot] = len(current[recipe_id])
+            for ingredient_id in current[recipe_id]:
+                posting = self.postings.get(
+                    ingredient_id, np.empty(0, dtype=np.int32))
+                self.postings[ingredient_id] = np.append(posting, slot)
+
+    def refresh(self):
+        """Догоняет изменения других процессов или перестраивает индекс."""
+        if (self.built_at is None
+                or time.monotonic() - self.built_at > INGREDIENT_INDEX_TTL):
+            return self.build()
+        version = current_version()
+        if version == self.version:
+            return
+        if not 0 < version - self.version <= INGREDIENT_INDEX_MAX_LAG:
+            return self.build()
+        changes = cache.get_many([
+            CHANGE_KEY.format(number)
+            for number in range(self.version + 1, version + 1)])
+        if len(changes) != version - self.version:
+            return self.build()
+        self.apply(set(changes.values()))
+        self.version = version
+
+    def recipes_changed(self, recipe_ids):
+        """Регистрирует изменения рецептов для всех процессов."""
+        recipe_ids = list(recipe_ids)
+        try:
+            version = cache.incr(VERSION_KEY, len(recipe_ids))
+        except ValueError:
+            cache.add(VERSION_KEY, time.time_ns(), None)
+            version = cache.incr(VERSION_KEY, len(recipe_ids))
+        first = version - len(recipe_ids) + 1
+        cache.set_many({
+            CHANGE_KEY.format(first + offset): recipe_id
+            for offset, recipe_id in enumerate(recipe_ids)
+        }, INGREDIENT_INDEX_TTL)
+        with self.lock:
+            if self.built_at is not None:
+                self.refresh()
+
+    def search(self, ingredient_ids, max_missing, limit, recipe_ids=None):
+        """Рецепты по покрытию ингредиентами: [(id, не хватает)].
+
+        Сначала рецепты, которые можно приготовить целиком, затем те,
+        где не хватает одного ингредиента, и т. д.; внутри группы —
+        более новые. recipe_ids ограничивает поиск рецептами,
+        прошедшими фильтры, до отбора первых limit.
+        """
+        with self.lock:
+            self.refresh()
+            counts = np.zeros(len(self.recipe_ids), dtype=np.int32)
+            for ingredient_id in set(ingredient_ids):
+                posting = self.postings.get(ingredient_id)
+                if posting is not None:
+                    counts[posting] += 1
+            if recipe_ids is not None:
+                allowed = np.zeros(len(self.recipe_ids), dtype=bool)
+                allowed[[self.slots[recipe_id] for recipe_id in recipe_ids
+                         if recipe_id in self.slots]] = True
+                counts[~allowed] = 0
+            hits = np.flatnonzero(counts)
+            missing = self.sizes[hits] - counts[hits]
+            hits, missing = (hits[missing <= max_missing],
+                             missing[missing <= max_missing])
+            order = np.lexsort((-self.recipe_ids[hits],
+                                -self.pub_dates[hits], missing))[:limit]
+            return list(zip(self.recipe_ids[hits[order]].tolist(),
+                            missing[order].tolist()))
+
+
+ingredient_index = IngredientIndex()
+
+
+def flush_changes():
+    connection = transaction.get_connection()
+    pending = connection.__dict__.pop(PENDING_ATTR, None)
+    if pending:
+        ingredient_index.recipes_changed(pending)
+
+
+def ingredients_changed(recipe_ids):
+    """Отметка рецептов, ингредиенты которых изменились.
+
+    Изменения регистрируются после фиксации транзакции одним проходом
+    на транзакцию. Вызывается из сигналов, поэтому учитываются правки
+    через API, админку и shell; bulk_create и SQL в обход ORM индекс
+    догоняет при перестроении раз в INGREDIENT_INDEX_TTL.
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    connection = transaction.get_connection()
+    connection.__dict__.setdefault(PENDING_ATTR, set()).update(recipe_ids)
+    transaction.on_commit(flush_changes)
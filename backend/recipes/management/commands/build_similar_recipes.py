@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.constants import SIMILAR_TOP_K
+from recipes.similarity import (build_matrix, build_neighbors, save_matrix,
+                                store_neighbors)
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт похожих рецептов по ингредиентам и тегам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--top-k', type=int, default=SIMILAR_TOP_K)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        data = build_matrix()
+        save_matrix(data)
+        self.stdout.write(
+            f'Матрица {data["matrix"].shape[0]}×{data["matrix"].shape[1]}, '
+            f'{data["matrix"].nnz} ненулевых элементов.')
+        batch = []
+        for item in build_neighbors(data, options['batch_size'],
+                                    options['top_k']):
+            batch.append(item)
+            if len(batch) == options['batch_size']:
+                store_neighbors(batch)
+                batch = []
+        store_neighbors(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны за '
+            f'{time.perf_counter() - started:.1f} с.'))
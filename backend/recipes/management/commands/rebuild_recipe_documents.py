@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.documents import refresh_documents
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Пересборка готовых документов рецептов. Нужна после '
+            'миграции и изменения формата ответа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int,
+                            help='id рецептов; по умолчанию все.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recipes = Recipe.objects.order_by('pk')
+        if options['ids']:
+            recipes = recipes.filter(pk__in=options['ids'])
+        recipe_ids = list(recipes.values_list('pk', flat=True))
+        refresh_documents(recipe_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано документов: {len(recipe_ids)} за '
+            f'{time.perf_counter() - started:.1f} с.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes.scores import update_scores
+
+
+class Command(BaseCommand):
+    help = ('Инкрементальный пересчёт популярности рецептов. '
+            'Запускать периодически, например из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать оценки с нуля.')
+
+    def handle(self, *args, **options):
+        updated = update_scores(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Оценки обновлены для {updated} рецептов.'))
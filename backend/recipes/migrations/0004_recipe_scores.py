@@ -0,0 +1,82 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:28
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_created(apps, schema_editor):
+    """Дата публикации рецепта для уже существующих записей.
+
+    Настоящее время добавления неизвестно; с датой миграции все старые
+    записи выглядели бы новыми и определяли бы trending.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for name in ('FavoriteRecipe', 'ShoppingCart'):
+        apps.get_model('recipes', name).objects.update(created=Subquery(
+            Recipe.objects.filter(pk=OuterRef('recipe_id')).values(
+                'pub_date')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=32, unique=True, verbose_name='Источник событий')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Последний учтённый id')),
+            ],
+            options={
+                'verbose_name': 'Водяной знак пересчёта',
+                'verbose_name_plural': 'Водяные знаки пересчёта',
+            },
+        ),
+        migrations.AddField(
+            model_name='favoriterecipe',
+            name='created',
+            field=models.DateTimeField(null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(default=0, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending',
+            field=models.FloatField(default=0, verbose_name='Набирает популярность'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.RunPython(backfill_created, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='favoriterecipe',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending', '-id'], name='recipe_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cooking_time', 'id'], name='recipe_cooking_time_idx'),
+        ),
+    ]
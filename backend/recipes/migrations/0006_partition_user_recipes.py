@@ -0,0 +1,72 @@
+from django.db import migrations
+
+# Число секций нельзя поменять без пересоздания таблиц.
+PARTITIONS = 16
+MODELS = ('favoriterecipe', 'shoppingcart')
+
+
+def rebuild(schema_editor, model, partitioned):
+    """Пересоздание таблицы модели с копированием строк.
+
+    Секционированная таблица делится по хешу user_id, поэтому первичный
+    ключ и уникальные ограничения включают user_id; id по-прежнему
+    уникален благодаря последовательности. Ограничения и индексы
+    создаются средствами Django с прежними именами.
+    """
+    table = model._meta.db_table
+    quote = schema_editor.quote_name
+    new_table = f'{table}_new'
+    partition_by = ' PARTITION BY HASH (user_id)' if partitioned else ''
+    schema_editor.execute(
+        f'CREATE TABLE {quote(new_table)} (LIKE {quote(table)} '
+        f'INCLUDING DEFAULTS){partition_by}')
+    if partitioned:
+        for remainder in range(PARTITIONS):
+            schema_editor.execute(
+                f'CREATE TABLE {quote(f"{table}_p{remainder}")} '
+                f'PARTITION OF {quote(new_table)} FOR VALUES WITH '
+                f'(MODULUS {PARTITIONS}, REMAINDER {remainder})')
+    schema_editor.execute(
+        f'INSERT INTO {quote(new_table)} SELECT * FROM {quote(table)}')
+    # Последовательность id удалилась бы вместе со старой таблицей.
+    schema_editor.execute(
+        f"ALTER SEQUENCE {quote(f'{table}_id_seq')} "
+        f"OWNED BY {quote(new_table)}.id")
+    schema_editor.execute(f'DROP TABLE {quote(table)}')
+    schema_editor.execute(
+        f'ALTER TABLE {quote(new_table)} RENAME TO {quote(table)}')
+    primary_key = 'id, user_id' if partitioned else 'id'
+    schema_editor.execute(
+        f'ALTER TABLE {quote(table)} ADD CONSTRAINT '
+        f'{quote(f"{table}_pkey")} PRIMARY KEY ({primary_key})')
+    for constraint in model._meta.constraints:
+        schema_editor.add_constraint(model, constraint)
+    for name in ('user', 'recipe'):
+        field = model._meta.get_field(name)
+        schema_editor.execute(schema_editor._create_fk_sql(
+            model, field, '_fk_%(to_table)s_%(to_column)s'))
+        schema_editor.execute(
+            schema_editor._create_index_sql(model, fields=[field]))
+
+
+def partition(apps, schema_editor, partitioned=True):
+    if schema_editor.connection.vendor != 'postgresql':
+        # В SQLite таблицы остаются обычными.
+        return
+    for name in MODELS:
+        rebuild(schema_editor, apps.get_model('recipes', name), partitioned)
+
+
+def unpartition(apps, schema_editor):
+    partition(apps, schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Формат документа на момент миграции; дальнейшие изменения формата
+# применяются командой rebuild_recipe_documents.
+BATCH = 500
+
+
+def file_url(file):
+    return file.url if file else None
+
+
+def build_document(recipe):
+    author = recipe.author
+    return {
+        'id': recipe.pk,
+        'tags': [
+            {'id': tag.pk, 'name': tag.name, 'slug': tag.slug}
+            for tag in recipe.tags.all()
+        ],
+        'author': {
+            'email': author.email,
+            'id': author.pk,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'avatar': file_url(author.avatar),
+        },
+        'ingredients': [
+            {'id': item.ingredient_id,
+             'name': item.ingredient.name,
+             'measurement_unit': item.ingredient.measurement_unit,
+             'amount': item.amount}
+            for item in recipe.recipeingredient_set.all()
+        ],
+        'name': recipe.name,
+        'image': file_url(recipe.image),
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+def build_documents(apps, schema_editor):
+    """Документы для рецептов, созданных до появления таблицы."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeDocument = apps.get_model('recipes', 'RecipeDocument')
+    recipes = Recipe.objects.select_related('author').prefetch_related(
+        'tags', 'recipeingredient_set__ingredient').order_by('pk')
+    last_id = 0
+    while True:
+        batch = list(recipes.filter(pk__gt=last_id)[:BATCH])
+        if not batch:
+            break
+        RecipeDocument.objects.bulk_create(
+            RecipeDocument(recipe_id=recipe.pk, data=build_document(recipe))
+            for recipe in batch)
+        last_id = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_partition_user_recipes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('data', models.JSONField(verbose_name='Документ')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Документ рецепта',
+                'verbose_name_plural': 'Документы рецептов',
+            },
+        ),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def reset_watermarks(apps, schema_editor):
+    # Старые водяные знаки по id не переводятся во время: следующий
+    # пересчёт будет полным.
+    apps.get_model('recipes', 'ScoreWatermark').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipedocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_watermarks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='scorewatermark',
+            name='last_id',
+        ),
+        migrations.AddField(
+            model_name='scorewatermark',
+            name='last_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время пересчёта'),
+            preserve_default=False,
+        ),
+    ]
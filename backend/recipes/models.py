@@ -99,9 +99,29 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True,
     )
+    popularity = models.FloatField(
+        default=0,
+        verbose_name='Популярность'
+    )
+    trending = models.FloatField(
+        default=0,
+        verbose_name='Набирает популярность'
+    )
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date'),
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=('-popularity', '-id'),
+                         name='recipe_popularity_idx'),
+            models.Index(fields=('-trending', '-id'),
+                         name='recipe_trending_idx'),
+            models.Index(fields=('cooking_time', 'id'),
+                         name='recipe_cooking_time_idx'),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -158,6 +178,10 @@ class BaseUserRecipe(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         abstract = True
@@ -201,6 +225,148 @@ class ShoppingCart(BaseUserRecipe):
         return f'{self.user.username} добавил {self.recipe.name} в список'
 
 
+class FeedItem(models.Model):
+    """Модель записи ленты подписок.
+
+    Заполняется при публикации рецепта для каждого подписчика автора
+    (fan-out on write); дата публикации продублирована, чтобы лента
+    читалась одним проходом по индексу.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        ordering = ('-pub_date', '-recipe')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_user_pub_date_idx'
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+
+    def __str__(self):
+        return f'{self.recipe_id} в ленте {self.user_id}'
+
+
+class SimilarRecipe(models.Model):
+    """Модель предрассчитанного похожего рецепта."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbors',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbor_of',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+
+    class Meta:
+        ordering = ('recipe', '-score')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx'
+            ),
+        )
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.similar_id} похож на {self.recipe_id}'
+
+
+class RecipeDocument(models.Model):
+    """Модель готового JSON рецепта.
+
+    Хранит поля ответа API, не зависящие от пользователя: автора, теги
+    и ингредиенты с единицами измерения. Ссылки на изображения
+    относительные, флаги пользователя подставляются при выдаче.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт'
+    )
+    data = models.JSONField(
+        verbose_name='Документ'
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    class Meta:
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self):
+        return f'Документ рецепта {self.recipe_id}'
+
+
+class ScoreWatermark(models.Model):
+    """Время последнего пересчёта популярности рецептов.
+
+    Источник events — начало последнего пересчёта, с которого ищутся
+    новые события; full — начало последнего полного пересчёта.
+    """
+    source = models.CharField(
+        max_length=MAX_LEN_TAG,
+        unique=True,
+        verbose_name='Источник событий'
+    )
+    last_time = models.DateTimeField(
+        verbose_name='Время пересчёта'
+    )
+
+    class Meta:
+        verbose_name = 'Водяной знак пересчёта'
+        verbose_name_plural = 'Водяные знаки пересчёта'
+
+    def __str__(self):
+        return f'{self.source}: {self.last_time}'
+
+
 class ShortLink(models.Model):
     """Модель короткой ссылки."""
     short_url = models.CharField(
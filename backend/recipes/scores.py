@@ -0,0 +1,120 @@
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .constants import (CART_SCORE_WEIGHT, FAVORITE_SCORE_WEIGHT,
+                        POPULAR_HALF_LIFE_DAYS, SCORE_BATCH,
+                        SCORE_FULL_RECOMPUTE_HOURS, SCORE_OVERLAP_SECONDS,
+                        TRENDING_HALF_LIFE_DAYS)
+from .models import FavoriteRecipe, Recipe, ScoreWatermark, ShoppingCart
+
+SCORE_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+EVENTS_SOURCE = 'events'
+FULL_SOURCE = 'full'
+EVENT_SOURCES = (
+    (FavoriteRecipe, FAVORITE_SCORE_WEIGHT),
+    (ShoppingCart, CART_SCORE_WEIGHT),
+)
+SCORE_FIELDS = (
+    ('popularity', POPULAR_HALF_LIFE_DAYS),
+    ('trending', TRENDING_HALF_LIFE_DAYS),
+)
+
+
+def decay_rate(half_life_days):
+    return math.log(2) / (half_life_days * 86400)
+
+
+def event_times(model, recipe_ids):
+    events = model.objects.order_by()
+    if recipe_ids is None:
+        return events.values_list('recipe_id', 'created').iterator()
+    recipe_ids = list(recipe_ids)
+    return (
+        row
+        for start in range(0, len(recipe_ids), SCORE_BATCH)
+        for row in events.filter(
+            recipe_id__in=recipe_ids[start:start + SCORE_BATCH]
+        ).values_list('recipe_id', 'created').iterator())
+
+
+def collect_events(recipe_ids=None):
+    """Добавления в избранное/корзину: (recipe_id, сек. от эпохи, вес).
+
+    Без recipe_ids — все события, иначе только события этих рецептов.
+    События до эпохи считаются случившимися в эпоху.
+    """
+    event_recipe_ids, seconds, weights = [], [], []
+    for model, weight in EVENT_SOURCES:
+        for recipe_id, created in event_times(model, recipe_ids):
+            event_recipe_ids.append(recipe_id)
+            seconds.append(
+                max(0.0, (created - SCORE_EPOCH).total_seconds()))
+            weights.append(weight)
+    return (np.array(event_recipe_ids, dtype=np.int64), np.array(seconds),
+            np.array(weights))
+
+
+def changed_recipes(since):
+    """Рецепты, в избранное или корзину которых добавляли после since."""
+    changed = set()
+    for model, _ in EVENT_SOURCES:
+        changed.update(model.objects.filter(
+            created__gt=since
+        ).order_by().values_list('recipe_id', flat=True).distinct())
+    return changed
+
+
+def update_scores(full=False):
+    """Пересчёт оценок популярности с затуханием во времени.
+
+    Оценка хранится в логарифмической шкале «forward decay»:
+    log(1 + Σ w·exp(λ·(t - эпоха))), у рецепта без событий — 0. Порядок
+    по ней совпадает с порядком по текущей затухшей оценке, поэтому
+    пересчитываются только рецепты
+    с новыми событиями — каждый целиком по всем своим событиям, так что
+    повторный учёт события ничего не портит. Новые события ищутся
+    с перекрытием SCORE_OVERLAP_SECONDS, чтобы не пропустить строки,
+    зафиксированные позже, чем созданы. Удаления из избранного и
+    корзины учитываются при следующем пересчёте рецепта и при полном
+    пересчёте, который выполняется не реже раза
+    в SCORE_FULL_RECOMPUTE_HOURS. Возвращает число обновлённых рецептов.
+    """
+    started = timezone.now()
+    watermark = dict(ScoreWatermark.objects.values_list(
+        'source', 'last_time'))
+    full = (full or FULL_SOURCE not in watermark
+            or EVENTS_SOURCE not in watermark
+            or started - watermark[FULL_SOURCE] > timedelta(
+                hours=SCORE_FULL_RECOMPUTE_HOURS))
+    changed = None if full else changed_recipes(
+        watermark[EVENTS_SOURCE] - timedelta(seconds=SCORE_OVERLAP_SECONDS))
+    recipe_ids, seconds, weights = collect_events(changed)
+    scored, positions = np.unique(recipe_ids, return_inverse=True)
+    with transaction.atomic():
+        if full:
+            Recipe.objects.exclude(popularity=0, trending=0).update(
+                popularity=0, trending=0)
+        else:
+            # Все события рецепта удалены.
+            Recipe.objects.filter(
+                pk__in=changed - set(scored.tolist())
+            ).update(popularity=0, trending=0)
+        recipes = [Recipe(pk=pk) for pk in scored.tolist()]
+        for field, half_life in SCORE_FIELDS:
+            contributions = decay_rate(half_life) * seconds + np.log(weights)
+            scores = np.full(len(scored), -np.inf)
+            np.logaddexp.at(scores, positions, contributions)
+            for recipe, score in zip(
+                    recipes, np.logaddexp(0, scores).tolist()):
+                setattr(recipe, field, score)
+        Recipe.objects.bulk_update(
+            recipes, [field for field, _ in SCORE_FIELDS], batch_size=1000)
+        sources = (EVENTS_SOURCE, FULL_SOURCE) if full else (EVENTS_SOURCE,)
+        for source in sources:
+            ScoreWatermark.objects.update_or_create(
+                source=source, defaults={'last_time': started})
+    return len(recipes) if full else len(changed)
@@ -0,0 +1,131 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from foodgram.edge_cache import purge
+from foodgram.paginators import counts_changed
+from users.models import Follow, User
+from .documents import documents_changed
+from .feed import backfill_feed, fan_out_recipe, trim_feed
+from .ingredient_index import ingredients_changed
+from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Tag)
+from .tags import invalidate_tag_map
+from .user_recipes import user_recipes_changed
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        fan_out_recipe(instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    counts_changed('recipes.recipe')
+    purge('recipes', f'recipes-{instance.pk}',
+          f'authors-{instance.author_id}')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    documents_changed([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_index_changed(sender, instance, **kwargs):
+    ingredients_changed([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    documents_changed([instance.recipe_id])
+    ingredients_changed([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if not reverse:
+        if not action.startswith('post_'):
+            return
+        recipe_ids = [instance.pk]
+    elif action in ('post_add', 'post_remove'):
+        recipe_ids = pk_set
+    elif action == 'pre_clear':
+        # После очистки связи уже не найти.
+        recipe_ids = list(sender.objects.filter(
+            **{instance._meta.model_name: instance}
+        ).values_list('recipe_id', flat=True))
+    else:
+        return
+    documents_changed(recipe_ids)
+    if sender is Recipe.ingredients.through:
+        ingredients_changed(recipe_ids)
+
+
+# Поля автора, которые входят в документ рецепта.
+AUTHOR_DOCUMENT_FIELDS = frozenset(
+    ('email', 'username', 'first_name', 'last_name', 'avatar'))
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields is not None
+                   and not AUTHOR_DOCUMENT_FIELDS & set(update_fields)):
+        return
+    documents_changed(Recipe.objects.filter(
+        author=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    counts_changed(f'user-{instance.user_id}')
+    if created:
+        backfill_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counts_changed(f'user-{instance.user_id}')
+    trim_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    invalidate_tag_map()
+    purge('tags', f'tags-{instance.pk}', 'recipes')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_documents_changed(sender, instance, **kwargs):
+    # Связи с рецептами удаляются каскадом без сигналов m2m_changed.
+    documents_changed(Recipe.objects.filter(
+        tags=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    purge('ingredients', 'recipes')
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_documents_changed(sender, instance, created, **kwargs):
+    if not created:
+        documents_changed(RecipeIngredient.objects.filter(
+            ingredient=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+def user_recipe_changed(sender, instance, **kwargs):
+    user_recipes_changed(sender, instance.user_id)
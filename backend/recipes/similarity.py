@@ -0,0 +1,221 @@
+import os
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from foodgram.background import BackgroundQueue
+from .constants import SIMILAR_TAG_WEIGHT, SIMILAR_TOP_K
+from .models import Recipe, RecipeIngredient, SimilarRecipe
+
+loaded_matrix = {}
+
+
+def build_matrix():
+    """Разреженная матрица рецепт × (ингредиенты + теги) с TF-IDF весами.
+
+    Строки нормированы, поэтому скалярное произведение строк равно
+    косинусному сходству.
+    """
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('pk').values_list('pk', flat=True),
+        dtype=np.int64)
+    ingredient_pairs = np.array(
+        list(RecipeIngredient.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id')),
+        dtype=np.int64).reshape(-1, 2)
+    tag_pairs = np.array(
+        list(Recipe.tags.through.objects.order_by().values_list(
+            'recipe_id', 'tag_id')),
+        dtype=np.int64).reshape(-1, 2)
+    ingredient_ids = np.unique(ingredient_pairs[:, 1])
+    tag_ids = np.unique(tag_pairs[:, 1])
+    rows = np.searchsorted(
+        recipe_ids, np.concatenate((ingredient_pairs[:, 0], tag_pairs[:, 0])))
+    columns = np.concatenate((
+        np.searchsorted(ingredient_ids, ingredient_pairs[:, 1]),
+        len(ingredient_ids) + np.searchsorted(tag_ids, tag_pairs[:, 1])))
+    n_features = len(ingredient_ids) + len(tag_ids)
+    document_frequency = np.bincount(columns, minlength=n_features)
+    weights = np.log(
+        (1 + len(recipe_ids)) / (1 + document_frequency)) + 1
+    weights[len(ingredient_ids):] *= SIMILAR_TAG_WEIGHT
+    matrix = sparse.csr_matrix(
+        (weights[columns], (rows, columns)),
+        shape=(len(recipe_ids), n_features))
+    return {
+        'recipe_ids': recipe_ids,
+        'ingredient_ids': ingredient_ids,
+        'tag_ids': tag_ids,
+        'weights': weights,
+        'matrix': normalize(matrix),
+    }
+
+
+def normalize(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def save_matrix(data, path=None):
+    matrix = data['matrix']
+    np.savez(
+        path or settings.SIMILARITY_MATRIX_PATH,
+        recipe_ids=data['recipe_ids'],
+        ingredient_ids=data['ingredient_ids'],
+        tag_ids=data['tag_ids'],
+        weights=data['weights'],
+        data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+        shape=matrix.shape)
+
+
+def load_matrix(path=None):
+    """Снимок матрицы из файла; кэшируется в процессе до его изменения."""
+    path = str(path or settings.SIMILARITY_MATRIX_PATH)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = loaded_matrix.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with np.load(path) as stored:
+        data = {key: stored[key] for key in (
+            'recipe_ids', 'ingredient_ids', 'tag_ids', 'weights')}
+        data['matrix'] = sparse.csr_matrix(
+            (stored['data'], stored['indices'], stored['indptr']),
+            shape=tuple(stored['shape']))
+    loaded_matrix[path] = (mtime, data)
+    return data
+
+
+def top_k(scores, columns, exclude, k):
+    """Индексы и значения k наибольших сходств строки."""
+    keep = (columns != exclude) & (scores > 0)
+    scores, columns = scores[keep], columns[keep]
+    if len(scores) > k:
+        best = np.argpartition(-scores, k)[:k]
+        scores, columns = scores[best], columns[best]
+    order = np.argsort(-scores, kind='stable')
+    return columns[order], scores[order]
+
+
+def build_neighbors(data, batch_size=1000, top=SIMILAR_TOP_K):
+    """Пакетный расчёт соседей: (id рецепта, [(id соседа, сходство)])."""
+    matrix = data['matrix']
+    recipe_ids = data['recipe_ids']
+    transposed = matrix.T.tocsc()
+    for start in range(0, matrix.shape[0], batch_size):
+        scores = (matrix[start:start + batch_size] @ transposed).tocsr()
+        for offset in range(scores.shape[0]):
+            row = slice(scores.indptr[offset], scores.indptr[offset + 1])
+            columns, values = top_k(
+                scores.data[row], scores.indices[row], start + offset, top)
+            yield recipe_ids[start + offset], list(
+                zip(recipe_ids[columns].tolist(), values.tolist()))
+
+
+def store_neighbors(items):
+    """Замена списков соседей для пачки рецептов одной транзакцией."""
+    items = list(items)
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(
+            recipe_id__in=[int(recipe_id) for recipe_id, _ in items]
+        ).delete()
+        SimilarRecipe.objects.bulk_create(
+            [SimilarRecipe(recipe_id=int(recipe_id), similar_id=similar_id,
+                           score=score)
+             for recipe_id, neighbors in items
+             for similar_id, score in neighbors],
+            batch_size=1000)
+
+
+def recipe_vector(data, recipe_id):
+    """Нормированный вектор рецепта в признаках сохранённой матрицы."""
+    ingredient_ids = RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', flat=True)
+    tag_ids = Recipe.tags.through.objects.filter(
+        recipe_id=recipe_id).values_list('tag_id', flat=True)
+    columns = []
+    for ids, known, offset in (
+            (ingredient_ids, data['ingredient_ids'], 0),
+            (tag_ids, data['tag_ids'], len(data['ingredient_ids']))):
+        ids = np.fromiter(ids, dtype=np.int64)
+        positions = np.searchsorted(known, ids)
+        found = positions < len(known)
+        found[found] &= known[positions[found]] == ids[found]
+        columns.append(positions[found] + offset)
+    columns = np.concatenate(columns)
+    vector = sparse.csr_matrix(
+        (data['weights'][columns], (np.zeros_like(columns), columns)),
+        shape=(1, data['matrix'].shape[1]))
+    return normalize(vector)
+
+
+def update_recipe_neighbors(recipe_id, top=SIMILAR_TOP_K):
+    """Инкрементальный пересчёт соседей после изменения рецепта.
+
+    Вектор рецепта сравнивается со снимком матрицы; рецепт также
+    добавляется в списки своих соседей, которые затем обрезаются
+    до top записей.
+    """
+    data = load_matrix()
+    if data is None:
+        return
+    scores = (data['matrix'] @ recipe_vector(data, recipe_id).T).tocoo()
+    exclude = np.searchsorted(data['recipe_ids'], recipe_id)
+    if (exclude == len(data['recipe_ids'])
+            or data['recipe_ids'][exclude] != recipe_id):
+        exclude = -1
+    columns, values = top_k(scores.data, scores.row, exclude, top)
+    existing = set(Recipe.objects.filter(
+        pk__in=data['recipe_ids'][columns].tolist()
+    ).values_list('pk', flat=True))
+    neighbors = [
+        (similar_id, score)
+        for similar_id, score in zip(data['recipe_ids'][columns].tolist(),
+                                     values.tolist())
+        if similar_id in existing
+    ]
+    with transaction.atomic():
+        store_neighbors([(recipe_id, neighbors)])
+        SimilarRecipe.objects.filter(similar_id=recipe_id).delete()
+        SimilarRecipe.objects.bulk_create(
+            [SimilarRecipe(recipe_id=similar_id, similar_id=recipe_id,
+                           score=score)
+             for similar_id, score in neighbors],
+            ignore_conflicts=True)
+        trim_neighbors([similar_id for similar_id, _ in neighbors], top)
+
+
+def trim_neighbors(recipe_ids, top=SIMILAR_TOP_K):
+    """Оставляет в списках соседей рецептов только top лучших."""
+    extra = []
+    kept = {}
+    for pk, recipe_id in SimilarRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+    ).order_by('recipe_id', '-score', 'pk').values_list('pk', 'recipe_id'):
+        kept[recipe_id] = kept.get(recipe_id, 0) + 1
+        if kept[recipe_id] > top:
+            extra.append(pk)
+    if extra:
+        SimilarRecipe.objects.filter(pk__in=extra).delete()
+
+
+def update_neighbors(recipe_ids):
+    for recipe_id in recipe_ids:
+        update_recipe_neighbors(recipe_id)
+
+
+neighbors_updates = BackgroundQueue('similar-recipes', update_neighbors)
+
+
+def schedule_neighbors_update(recipe_id):
+    """Пересчёт соседей рецепта в фоновом потоке процесса.
+
+    Запрос не ждёт пересчёта; матрица остаётся загруженной в памяти
+    процесса. Необработанные при перезапуске воркера рецепты догоняет
+    build_similar_recipes.
+    """
+    neighbors_updates.put(recipe_id)
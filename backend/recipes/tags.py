@@ -0,0 +1,26 @@
+from django.core.cache import cache
+
+from foodgram.metrics import record_cache
+from .constants import TAG_MAP_TTL
+from .models import Tag
+
+TAG_MAP_KEY = 'tags:slug-map'
+
+
+def get_tag_map():
+    """Словарь «слаг → id тега».
+
+    Хранится в общем кэше (Redis) и сбрасывается при изменении тегов;
+    срок TAG_MAP_TTL ограничивает устаревание, если сброс не сработал
+    (массовая загрузка без сигналов, гонка чтения со сбросом).
+    """
+    tag_map = cache.get(TAG_MAP_KEY)
+    record_cache('tags', tag_map is not None)
+    if tag_map is None:
+        tag_map = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(TAG_MAP_KEY, tag_map, TAG_MAP_TTL)
+    return tag_map
+
+
+def invalidate_tag_map():
+    cache.delete(TAG_MAP_KEY)
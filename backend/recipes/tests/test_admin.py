@@ -0,0 +1,81 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import User
+
+
+class AdminQueryCountTests(TestCase):
+    """Число запросов страниц админки не зависит от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='!',
+            first_name='Админ', last_name='Админ')
+        cls.tag = Tag.objects.create(name='Ужин', slug='dinner')
+        cls.rows = 0
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        """Рецепты с ингредиентами, тегом, избранным и корзиной."""
+        for number in range(self.rows, self.rows + count):
+            author = User.objects.create(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                first_name='Имя', last_name='Фамилия')
+            ingredient = Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г')
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}',
+                image='recipes/test.png', text='Описание', cooking_time=5)
+            recipe.tags.add(self.tag)
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1)
+            FavoriteRecipe.objects.create(user=author, recipe=recipe)
+            ShoppingCart.objects.create(user=author, recipe=recipe)
+        self.rows += count
+
+    def count_queries(self, path):
+        # Первый запрос заполняет кеши процесса, например ContentType.
+        self.client.get(path)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+        return len(captured)
+
+    def test_changelists(self):
+        changelist = reverse('admin:recipes_recipe_changelist')
+        paths = [
+            changelist,
+            f'{changelist}?tags__id__exact={self.tag.pk}',
+            f'{changelist}?q=Рецепт',
+            f'{changelist}?o=3',
+            reverse('admin:recipes_ingredient_changelist'),
+            reverse('admin:recipes_ingredient_changelist') + '?q=ингр',
+            reverse('admin:recipes_tag_changelist'),
+            reverse('admin:recipes_favoriterecipe_changelist'),
+            reverse('admin:recipes_shoppingcart_changelist'),
+        ]
+        self.add_rows(2)
+        few = [self.count_queries(path) for path in paths]
+        self.add_rows(10)
+        many = [self.count_queries(path) for path in paths]
+        for path, before, after in zip(paths, few, many):
+            with self.subTest(path=path):
+                self.assertEqual(before, after)
+
+    def test_recipe_change_page(self):
+        # Подпись выбранного ингредиента запрашивается в каждой строке
+        # инлайна, остальное от числа строк таблиц не зависит.
+        self.add_rows(1)
+        recipe = Recipe.objects.get()
+        path = reverse('admin:recipes_recipe_change', args=(recipe.pk,))
+        before = self.count_queries(path)
+        self.add_rows(10)
+        self.assertEqual(self.count_queries(path), before)
@@ -0,0 +1,35 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from foodgram.cache_versions import bump_version, get_version
+from foodgram.metrics import record_cache
+from foodgram.paginators import counts_changed
+from .constants import USER_RECIPES_TTL
+
+VERSION_KEY = 'user-recipes:{}:{}:version'
+IDS_KEY = 'user-recipes:{}:{}:{}'
+
+
+def get_user_recipe_ids(model, user_id):
+    """Множество id рецептов пользователя в избранном/корзине.
+
+    Кэшируется под версией пользователя: запись, посчитанная до
+    изменения, попадает под старую версию и больше не читается.
+    """
+    name = model._meta.model_name
+    key = IDS_KEY.format(name, user_id,
+                         get_version(VERSION_KEY.format(name, user_id)))
+    recipe_ids = cache.get(key)
+    record_cache('user_recipes', recipe_ids is not None)
+    if recipe_ids is None:
+        recipe_ids = frozenset(model.objects.filter(
+            user_id=user_id).values_list('recipe_id', flat=True))
+        cache.set(key, recipe_ids, USER_RECIPES_TTL)
+    return recipe_ids
+
+
+def user_recipes_changed(model, user_id):
+    """Сдвиг версии после фиксации транзакции с изменением списка."""
+    key = VERSION_KEY.format(model._meta.model_name, user_id)
+    transaction.on_commit(lambda: bump_version(key))
+    counts_changed(f'user-{user_id}')
@@ -1,13 +1,32 @@
 from django.contrib import admin
+from django.contrib.auth.models import Permission
 
+from foodgram.paginators import EstimatedCountPaginator
 from .models import Follow, User
 
 
 class UserAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name')
     search_fields = ('username', 'email')
-    list_filter = ('first_name', 'last_name')
+    list_filter = ('is_staff', 'is_active')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name == 'user_permissions':
+            kwargs['queryset'] = Permission.objects.select_related(
+                'content_type')
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
-admin.site.register(Follow)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,97 @@
+import hashlib
+import pickle
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from foodgram.metrics import record_cache
+from .constants import (AUTH_TOKEN_CACHE_TTL, AUTH_TOKEN_LOCAL_MAX,
+                        AUTH_TOKEN_LOCAL_TTL)
+
+TOKEN_KEY = 'auth-token:{}'
+
+local_tokens = {}
+local_lock = threading.Lock()
+
+
+def cache_key(key):
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def get_local(key):
+    with local_lock:
+        cached = local_tokens.get(key)
+        if cached is None:
+            return None
+        if cached[1] < time.monotonic():
+            del local_tokens[key]
+            return None
+    # Каждый запрос получает свою копию: пользователя могут изменять.
+    return pickle.loads(cached[0])
+
+
+def set_local(key, token):
+    with local_lock:
+        if len(local_tokens) >= AUTH_TOKEN_LOCAL_MAX:
+            local_tokens.clear()
+        local_tokens[key] = (pickle.dumps(token),
+                             time.monotonic() + AUTH_TOKEN_LOCAL_TTL)
+
+
+def invalidate_token(key):
+    with local_lock:
+        local_tokens.pop(key, None)
+    cache.delete(cache_key(key))
+
+
+def invalidate_user_tokens(user_id):
+    for key in Token.objects.filter(user_id=user_id).values_list(
+            'key', flat=True):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием токена и пользователя.
+
+    Токен ищется в памяти процесса, затем в общем кэше (Redis, если
+    задан REDIS_URL) и только потом в БД. При выходе, смене пароля,
+    изменении и удалении пользователя запись в общем кэше удаляется,
+    а другие процессы принимают старый токен не дольше
+    AUTH_TOKEN_LOCAL_TTL секунд. Без общего кэша используется только
+    память процесса с тем же сроком.
+    """
+
+    def authenticate_credentials(self, key):
+        token = get_local(key)
+        record_cache('auth_token_local', token is not None)
+        if token is None:
+            token = self.get_shared(key)
+            set_local(key, token)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return token.user, token
+
+    def get_shared(self, key):
+        if not settings.SHARED_CACHE:
+            # Кэш в памяти процесса не очищается из других воркеров.
+            return self.get_token(key)
+        token = cache.get(cache_key(key))
+        record_cache('auth_token', token is not None)
+        if token is None:
+            token = self.get_token(key)
+            cache.set(cache_key(key), token, AUTH_TOKEN_CACHE_TTL)
+        return token
+
+    def get_token(self, key):
+        try:
+            return self.get_model().objects.select_related('user').get(
+                key=key)
+        except self.get_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
@@ -1,3 +1,6 @@
 MAX_LEN_PASS_USER = 128
 MAX_LEN_USER = 150
 MAX_USER_EMAIL = 254
+AUTH_TOKEN_CACHE_TTL = 60
+AUTH_TOKEN_LOCAL_TTL = 5
+AUTH_TOKEN_LOCAL_MAX = 10000
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_auto_20240519_1136'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.CharField(max_length=254, unique=True, verbose_name='Email'),
+        ),
+    ]
@@ -21,6 +21,7 @@ class User(AbstractUser):
         ],
     )
     email = models.CharField(
+        unique=True,
         max_length=MAX_USER_EMAIL,
         verbose_name='Email'
     )
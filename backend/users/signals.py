@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from foodgram.paginators import counts_changed
+from .authentication import invalidate_token, invalidate_user_tokens
+from .models import User
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+# Поля пользователя, от которых зависит проверка токена, и поля профиля,
+# которые отдаются из закэшированного request.user (users/me).
+TOKEN_USER_FIELDS = ('password', 'is_active', 'is_staff', 'is_superuser',
+                     'email', 'username', 'first_name', 'last_name',
+                     'avatar')
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields, **kwargs):
+    """Сравнение с сохранённой строкой: изменились ли поля токена.
+
+    Сохранение только last_login при входе поля токена не затрагивает
+    и обходится без запроса.
+    """
+    fields = [name for name in TOKEN_USER_FIELDS
+              if update_fields is None or name in update_fields]
+    instance.tokens_stale = False
+    if instance.pk is None or not fields:
+        return
+    stored = User.objects.filter(pk=instance.pk).values(*fields).first()
+    instance.tokens_stale = stored is not None and any(
+        instance._meta.get_field(name).value_from_object(instance)
+        != stored[name] for name in fields)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    if getattr(instance, 'tokens_stale', False):
+        invalidate_user_tokens(instance.pk)
+    if created:
+        counts_changed('users.user')
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    counts_changed('users.user')
@@ -0,0 +1,51 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from users.models import Follow, User
+
+
+class AdminQueryCountTests(TestCase):
+    """Число запросов страниц админки не зависит от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='!',
+            first_name='Админ', last_name='Админ')
+        cls.rows = 0
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for number in range(self.rows, self.rows + count):
+            user = User.objects.create(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='Имя', last_name='Фамилия')
+            Follow.objects.create(user=user, author=self.admin)
+        self.rows += count
+
+    def count_queries(self, path):
+        # Первый запрос заполняет кеши процесса, например ContentType.
+        self.client.get(path)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+        return len(captured)
+
+    def test_pages(self):
+        paths = [
+            reverse('admin:users_user_changelist'),
+            reverse('admin:users_user_changelist') + '?q=user',
+            reverse('admin:users_follow_changelist'),
+            reverse('admin:users_user_change', args=(self.admin.pk,)),
+        ]
+        self.add_rows(2)
+        few = [self.count_queries(path) for path in paths]
+        self.add_rows(10)
+        many = [self.count_queries(path) for path in paths]
+        for path, before, after in zip(paths, few, many):
+            with self.subTest(path=path):
+                self.assertEqual(before, after)
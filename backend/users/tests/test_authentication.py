@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from users.authentication import local_tokens
+from users.models import User
+
+ME_URL = '/api/users/me/'
+
+
+class CachedTokenTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='secret-1',
+            first_name='Имя', last_name='Фамилия')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        local_tokens.clear()
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.user.refresh_from_db()
+
+    def test_token_is_cached(self):
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_200_OK)
+        # Токен и пользователь из кэша, остаётся запрос подписок
+        # для is_subscribed.
+        with self.assertNumQueries(1):
+            response = self.client.get(ME_URL)
+        self.assertEqual(response.data['username'], 'user')
+
+    def test_last_login_keeps_token(self):
+        self.client.get(ME_URL)
+        self.user.last_login = timezone.now()
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['last_login'])
+        self.assertIn(self.token.key, local_tokens)
+
+    def test_unrelated_save_keeps_token(self):
+        self.client.get(ME_URL)
+        self.user.save()
+        self.assertIn(self.token.key, local_tokens)
+
+    def test_password_change_invalidates(self):
+        self.client.get(ME_URL)
+        self.user.set_password('secret-2')
+        self.user.save()
+        self.assertNotIn(self.token.key, local_tokens)
+
+    def test_profile_change_is_visible(self):
+        self.client.get(ME_URL)
+        self.user.first_name = 'Другое'
+        self.user.save(update_fields=['first_name'])
+        self.assertEqual(self.client.get(ME_URL).data['first_name'],
+                         'Другое')
+
+    def test_deactivation_rejects_token(self):
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_rejects_token(self):
+        self.client.get(ME_URL)
+        self.token.delete()
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)